@@ -0,0 +1,250 @@
+import argparse
+import functools
+import json
+import math
+import platform
+import random
+import sys
+import time
+
+import simulation
+from sensor_layout import DEFAULT_LAYOUT, SensorLayout, SensorMount
+
+""" Number of repetitions of every benchmark, the fastest one is reported """
+BENCHMARK_REPEAT = 5
+""" Obstacle counts of the end-to-end scenes """
+SCENE_SIZES = [1, 10, 100, 1000]
+""" Share of rectangles in the end-to-end scenes """
+SCENE_MIXES = {"rect": 1.0, "mixed": 0.5, "circle": 0.0}
+""" Largest path length [m] by which the reference sweep may beat cross_circlesolve before the run fails """
+ACCURACY_TOLERANCE = 1e-9
+""" Largest share of the cases of the accuracy check in which only one of cross_circlesolve and the reference sweep
+finds an echo, they disagree where the sweep stops at the first point in range of both sensors (under 1 in 100) """
+MISMATCH_TOLERANCE = 0.05
+""" Largest sensor value difference [m] between the front sensors and the same sensors mirrored to the rear bumper """
+MIRROR_TOLERANCE = 1e-9
+""" Length [m] of the car of the mirror check, the rear bumper is at x = -MIRROR_CAR_LENGTH """
+MIRROR_CAR_LENGTH = 4.5
+
+
+def random_rectangle(rng, size):
+    """Rectangle in a size x size [m] area in front of the car"""
+    return simulation.Rectangle((rng.uniform(0.2, size), rng.uniform(-size / 2, size / 2)),
+                                rng.uniform(0.1, 1.5), rng.uniform(0.1, 2.0), rng.uniform(0, 2 * math.pi))
+
+
+def random_circle(rng, size):
+    """Circle in a size x size [m] area in front of the car"""
+    return simulation.Circle((rng.uniform(0.2, size), rng.uniform(-size / 2, size / 2)), rng.uniform(0.05, 0.8))
+
+
+def random_scene(rng, count, rect_share):
+    """Model with the given number of obstacles, the area grows with the obstacle count"""
+    size = max(6.0, 2.0 * math.sqrt(count))
+    model = simulation.Model()
+    rect_count = round(count * rect_share)
+    model.rect_list = [random_rectangle(rng, size) for _ in range(rect_count)]
+    model.circle_list = [random_circle(rng, size) for _ in range(count - rect_count)]
+    return model
+
+
+def sensor_pairs(rng, count):
+    """Adjacent sensor pairs of cars at random positions around the origin"""
+    pairs = []
+    for _ in range(count):
+        car_pos = (rng.uniform(-1, 0), rng.uniform(-1, 1))
+        index = rng.randrange(len(DEFAULT_LAYOUT) - 1)
+        pairs.append((simulation.Sensor(car_pos, index), simulation.Sensor(car_pos, index + 1)))
+    return pairs
+
+
+def measure(function, calls):
+    """Fastest time of BENCHMARK_REPEAT runs of the function, per call [s]"""
+    best = math.inf
+    for _ in range(BENCHMARK_REPEAT):
+        start = time.perf_counter()
+        function()
+        best = min(best, time.perf_counter() - start)
+    return best / calls
+
+
+def solver_benchmarks(rng, cases):
+    """Micro-benchmarks of the echo solvers on random sensor pairs and obstacles"""
+    pairs = sensor_pairs(rng, cases)
+    rectangles = [random_rectangle(rng, 4.0) for _ in range(cases)]
+    circles = [random_circle(rng, 4.0) for _ in range(cases)]
+    work = {
+        "rect_solve": lambda: [simulation.edge_solve(s1, rect) for (s1, s2), rect in zip(pairs, rectangles)],
+        "circle_solve": lambda: [simulation.circle_solve(s1, circle) for (s1, s2), circle in zip(pairs, circles)],
+        "cross_rectsolve": lambda: [simulation.cross_edgesolve(s1, s2, rect)
+                                    for (s1, s2), rect in zip(pairs, rectangles)],
+        "cross_circlesolve": lambda: [simulation.cross_circlesolve(s1, s2, circle)
+                                      for (s1, s2), circle in zip(pairs, circles)],
+    }
+    return {name: measure(function, cases) for name, function in work.items()}
+
+
+def step_benchmarks(rng, steps, model_class=simulation.Model, prefix="Model.step"):
+    """End-to-end steps on generated scenes, with the car moving on every step and with an idle car"""
+    results = {}
+    for count in SCENE_SIZES:
+        for mix, rect_share in SCENE_MIXES.items():
+            scene = random_scene(rng, count, rect_share)
+            model = model_class()
+            model.rect_list = scene.rect_list
+            model.circle_list = scene.circle_list
+
+            def moving():
+                for i in range(steps):
+                    model.car_pos = (-1 + i * 0.01, 0)
+                    model.step()
+
+            def idle():
+                for _ in range(steps):
+                    model.step()
+
+            results["{}[{},{}]".format(prefix, count, mix)] = measure(moving, steps)
+            results["{}.idle[{},{}]".format(prefix, count, mix)] = measure(idle, steps)
+    return results
+
+
+def cross_circle_accuracy(rng, cases):
+    """Accuracy check of cross_circlesolve against the reference sweep (simulation.cross_circle_check):
+    the smallest path length difference sweep - cross_circlesolve [m], negative if the sweep found a shorter path,
+    and the share of the cases in which only one of them found an echo"""
+    circles = [random_circle(rng, 4.0) for _ in range(cases)]
+    worst, only_solver, only_sweep = simulation.cross_circle_check(
+        [(s1, s2, circle) for (s1, s2), circle in zip(sensor_pairs(rng, cases), circles)])
+    return worst, (only_solver + only_sweep) / cases
+
+
+def mirrored(point):
+    """Point mirrored from the front to the rear of the car of the mirror check"""
+    return -MIRROR_CAR_LENGTH - point[0], point[1]
+
+
+def rear_mirror_accuracy(rng, cases):
+    """Symmetry check of the facing sides: the largest sensor value difference [m] between the default front layout
+    and the same layout mirrored to the rear bumper, on mirrored scenes with and without occlusion"""
+    rear = SensorLayout([SensorMount(*mirrored((mount.x, mount.y)), math.pi - mount.heading, mount.max_range,
+                                     mount.aperture, mount.group) for mount in DEFAULT_LAYOUT.mounts])
+    model_classes = [simulation.Model, functools.partial(simulation.Model, occlusion=True)]
+    try:
+        import ray_engine
+    except ImportError:
+        pass
+    else:
+        model_classes.append(ray_engine.VectorizedModel)
+    worst = 0.0
+    for _ in range(cases):
+        """Turned rectangles and an axis-parallel one, whose sides parallel to the sensors decide by the tie rule"""
+        rectangles = [random_rectangle(rng, 4.0) for _ in range(2)]
+        rectangles.append(simulation.Rectangle((rng.uniform(0.5, 3.0), rng.uniform(-2.0, 1.0)),
+                                               rng.uniform(0.1, 1.5), rng.uniform(0.1, 2.0), 0.0))
+        circles = [random_circle(rng, 4.0)]
+        car_pos = (rng.uniform(-1, 0), rng.uniform(-1, 1))
+        for model_class in model_classes:
+            front = model_class()
+            front.rect_list = rectangles
+            front.circle_list = circles
+            front.car_pos = car_pos
+            back = model_class(rear)
+            back.polygon_list = [simulation.Polygon([mirrored(corner) for corner in rectangle.corners])
+                                 for rectangle in rectangles]
+            back.circle_list = [simulation.Circle(mirrored(circle.center), circle.radius) for circle in circles]
+            back.car_pos = (-car_pos[0], car_pos[1])
+            front.step()
+            back.step()
+            for sensor, other in zip(front.sensor_list, back.sensor_list):
+                worst = max(worst, abs(sensor.direct_val - other.direct_val),
+                            abs(sensor.cross_val_l - other.cross_val_l), abs(sensor.cross_val_r - other.cross_val_r))
+    return worst
+
+
+def run(quick=False):
+    """Runs every benchmark, returns the JSON report"""
+    rng = random.Random(2021)
+    cases = 200 if quick else 2000
+    steps = 3 if quick else 20
+    results = solver_benchmarks(rng, cases)
+    results.update(step_benchmarks(rng, steps))
+    try:
+        import ray_engine
+    except ImportError:
+        pass
+    else:
+        results.update(step_benchmarks(rng, steps, ray_engine.VectorizedModel, "VectorizedModel.step"))
+    results.update(step_benchmarks(rng, steps, functools.partial(simulation.Model, occlusion=True),
+                                   "Model.step.occlusion"))
+    worst, mismatches = cross_circle_accuracy(rng, 20 if quick else 100)
+    return {
+        "python": platform.python_version(),
+        "machine": platform.machine(),
+        "unit": "seconds per call",
+        "results": results,
+        "cross_circlesolve_accuracy": worst,
+        "cross_circlesolve_mismatches": mismatches,
+        "rear_mirror_accuracy": rear_mirror_accuracy(rng, 20 if quick else 100),
+    }
+
+
+def accuracy_failures(report):
+    """Messages of the accuracy checks of the report that failed"""
+    failures = []
+    if report["cross_circlesolve_accuracy"] < -ACCURACY_TOLERANCE:
+        failures.append("cross_circlesolve is {:.3g} m longer than the reference sweep".format(
+            -report["cross_circlesolve_accuracy"]))
+    if report["cross_circlesolve_mismatches"] > MISMATCH_TOLERANCE:
+        failures.append("cross_circlesolve and the reference sweep disagree on the echo in {:.0%} of the cases".format(
+            report["cross_circlesolve_mismatches"]))
+    if report["rear_mirror_accuracy"] > MIRROR_TOLERANCE:
+        failures.append("the rear sensors differ from the mirrored front sensors by {:.3g} m".format(
+            report["rear_mirror_accuracy"]))
+    return failures
+
+
+def compare(report, baseline, tolerance):
+    """Benchmarks slower than the baseline by more than the tolerance: (name, baseline, current) list"""
+    regressions = []
+    for name, seconds in report["results"].items():
+        reference = baseline["results"].get(name)
+        if reference is not None and seconds > reference * (1 + tolerance):
+            regressions.append((name, reference, seconds))
+    return regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmarks the echo solvers and Model.step")
+    parser.add_argument("--output", default="-", help="JSON report file, '-' for the standard output")
+    parser.add_argument("--baseline", help="JSON report to compare against, exits with 1 on a regression "
+                                           "(a failed accuracy check always exits with 1)")
+    parser.add_argument("--tolerance", type=float, default=0.2,
+                        help="allowed slowdown relative to the baseline (default: 0.2 = 20%%)")
+    parser.add_argument("--quick", action="store_true", help="fewer cases and steps, for a smoke test")
+    args = parser.parse_args(argv)
+
+    report = run(args.quick)
+    text = json.dumps(report, indent=2)
+    if args.output == "-":
+        print(text)
+    else:
+        with open(args.output, "w") as file:
+            file.write(text + "\n")
+
+    failed = False
+    for message in accuracy_failures(report):
+        print("ACCURACY {}".format(message), file=sys.stderr)
+        failed = True
+    if args.baseline:
+        with open(args.baseline) as file:
+            baseline = json.load(file)
+        regressions = compare(report, baseline, args.tolerance)
+        for name, reference, seconds in regressions:
+            print("REGRESSION {}: {:.3g} s -> {:.3g} s".format(name, reference, seconds), file=sys.stderr)
+        failed = failed or bool(regressions)
+    if failed:
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,311 @@
+import argparse
+import asyncio
+import collections
+import concurrent.futures
+import struct
+import sys
+import time
+
+import scenario
+import simulation
+from control import Control
+from fixed_step import FixedStepLoop, SIMULATION_RATE, MAX_STEPS_PER_ADVANCE
+from recording import Frame, control_input
+from sensor_layout import DEFAULT_LAYOUT, load_layout
+
+""" Network bridge: the simulation runs in real time, every step is published to the connected clients as a frame
+message and the clients answer with command messages that set the speed of the car.
+TCP: the messages are sent back to back on the connection.
+UDP: every message is one datagram, any non-empty datagram to the server subscribes its sender to the frames.
+All values are little endian.
+"""
+
+
+def frame_message(sensor_count):
+    """Frame message: sequence number, simulation time [s], direct, left and right cross-echo value of every sensor
+    [m]"""
+    return struct.Struct("<Id{}f".format(3 * sensor_count))
+
+
+""" Command message: sequence number of the frame the command answers, speed of the car (0..1) """
+COMMAND_MESSAGE = struct.Struct("<Id")
+DEFAULT_TCP_PORT = 8765
+DEFAULT_UDP_PORT = 8766
+""" A TCP client with more unsent data than this skips frames until it catches up [bytes] """
+TCP_HIGH_WATER = 64 * 1024
+""" Number of latest frames whose send time is kept for the latency measurement """
+LATENCY_WINDOW = 4096
+
+
+class RemoteControl:
+    """Control of the car by the commands of the bridge clients, the speed of the last command is used"""
+
+    def __init__(self, speed=0):
+        self.output = speed
+        self.input = []
+
+    def get_speed(self):
+        return self.output
+
+
+class LatencyStats:
+    """Round-trip latency: time from sending a frame until a command answering it is received [s]"""
+
+    def __init__(self, window=LATENCY_WINDOW):
+        self.sent = collections.OrderedDict()
+        self.window = window
+        self.samples = collections.deque(maxlen=window)
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+
+    def frame_sent(self, sequence, sent_time):
+        self.sent[sequence] = sent_time
+        if len(self.sent) > self.window:
+            self.sent.popitem(last=False)
+
+    def command_received(self, sequence, received_time):
+        """Adds the latency of the answered frame, returns it or None if the frame is unknown or already answered"""
+        sent_time = self.sent.pop(sequence, None)
+        if sent_time is None:
+            return None
+        latency = received_time - sent_time
+        self.samples.append(latency)
+        self.count += 1
+        self.total += latency
+        self.max = max(self.max, latency)
+        return latency
+
+    def summary(self):
+        """Number of answered frames, mean and max latency, median and 99th percentile of the latest ones [s]"""
+        if not self.count:
+            return {"count": 0}
+        recent = sorted(self.samples)
+        return {"count": self.count, "mean": self.total / self.count, "max": self.max,
+                "p50": recent[len(recent) // 2], "p99": recent[min(len(recent) - 1, int(len(recent) * 0.99))]}
+
+
+class BridgeServer:
+    """Runs the model on a fixed step in real time, publishes every step and takes the speed from the clients.
+    run() solves the steps on a worker thread, so large scenes do not hold up the clients on the event loop.
+    """
+
+    def __init__(self, model, car_speed, time_step=1 / SIMULATION_RATE, initial_speed=0):
+        self.model = model
+        self.control = RemoteControl(initial_speed)
+        self.loop = FixedStepLoop(model, self.control, car_speed, time_step)
+        self.frame_message = frame_message(len(model.sensor_list))
+        self.sequence = 0
+        self.latency = LatencyStats()
+        self.tcp_clients = set()
+        self.udp_clients = set()
+        self.udp_transport = None
+        self.servers = []
+        self.sent = 0
+        self.skipped = 0
+        """One worker keeps the steps in order"""
+        self.executor = concurrent.futures.ThreadPoolExecutor(max_workers=1)
+
+    async def start(self, host="127.0.0.1", tcp_port=DEFAULT_TCP_PORT, udp_port=DEFAULT_UDP_PORT):
+        """Opens the TCP and UDP ports, a port of None is not opened, 0 picks a free port"""
+        if tcp_port is not None:
+            self.servers.append(await asyncio.start_server(self.handle_tcp, host, tcp_port))
+        if udp_port is not None:
+            self.udp_transport, _ = await asyncio.get_running_loop().create_datagram_endpoint(
+                lambda: UdpProtocol(self), local_addr=(host, udp_port))
+
+    def addresses(self):
+        """TCP and UDP addresses the server listens on"""
+        tcp = [socket.getsockname() for server in self.servers for socket in server.sockets]
+        udp = [self.udp_transport.get_extra_info("sockname")] if self.udp_transport else []
+        return tcp, udp
+
+    async def handle_tcp(self, reader, writer):
+        self.tcp_clients.add(writer)
+        try:
+            while True:
+                self.command(await reader.readexactly(COMMAND_MESSAGE.size))
+        except (asyncio.IncompleteReadError, ConnectionError):
+            pass
+        finally:
+            self.tcp_clients.discard(writer)
+            writer.close()
+
+    def command(self, data):
+        sequence, speed = COMMAND_MESSAGE.unpack(data)
+        self.control.output = speed
+        self.latency.command_received(sequence, time.perf_counter())
+
+    def step(self):
+        """Runs one fixed step and publishes its frame"""
+        step_time = self.loop.time
+        self.loop.step()
+        self.publish_frame(step_time)
+
+    def publish_frame(self, step_time):
+        """Publishes the sensor values of the step run at the time"""
+        values = []
+        for sensor in self.model.sensor_list:
+            values += [sensor.direct_val, sensor.cross_val_l, sensor.cross_val_r]
+        self.publish(self.frame_message.pack(self.sequence, step_time, *values))
+        self.sequence = (self.sequence + 1) & 0xFFFFFFFF
+
+    def publish(self, message):
+        """Sends the frame to every client without waiting, slow TCP clients skip it"""
+        self.latency.frame_sent(self.sequence, time.perf_counter())
+        for writer in list(self.tcp_clients):
+            if writer.transport.get_write_buffer_size() > TCP_HIGH_WATER:
+                self.skipped += 1
+            else:
+                writer.write(message)
+                self.sent += 1
+        for address in self.udp_clients:
+            self.udp_transport.sendto(message, address)
+            self.sent += 1
+
+    async def run(self, duration=None):
+        """Steps the simulation in real time for the duration [s] (rounded to whole steps like FixedStepLoop.run)
+        or forever. The commands received until a step is started are applied to it."""
+        event_loop = asyncio.get_running_loop()
+        start = event_loop.time()
+        steps = 0
+        total = None if duration is None else round(duration / self.loop.time_step)
+        while total is None or steps < total:
+            due = int((event_loop.time() - start) / self.loop.time_step) + 1 - steps
+            if due > MAX_STEPS_PER_ADVANCE:
+                """The CPU falls behind, the rest of the time is dropped like in FixedStepLoop.advance"""
+                start += (due - MAX_STEPS_PER_ADVANCE) * self.loop.time_step
+                due = MAX_STEPS_PER_ADVANCE
+            if total is not None:
+                due = min(due, total - steps)
+            for _ in range(due):
+                step_time = self.loop.time
+                await event_loop.run_in_executor(self.executor, self.loop.step)
+                self.publish_frame(step_time)
+                steps += 1
+            await asyncio.sleep(max(start + steps * self.loop.time_step - event_loop.time(), 0))
+
+    def close(self):
+        for server in self.servers:
+            server.close()
+        for writer in list(self.tcp_clients):
+            writer.close()
+        if self.udp_transport is not None:
+            self.udp_transport.close()
+        self.executor.shutdown()
+
+
+class UdpProtocol(asyncio.DatagramProtocol):
+    """UDP endpoint of the server: subscribes the senders and reads their commands"""
+
+    def __init__(self, server):
+        self.server = server
+
+    def datagram_received(self, data, address):
+        self.server.udp_clients.add(address)
+        if len(data) == COMMAND_MESSAGE.size:
+            self.server.command(data)
+
+
+class BridgeClient:
+    """TCP client of the bridge, e.g. for a control written in Python"""
+
+    def __init__(self, reader, writer, sensor_count=len(DEFAULT_LAYOUT)):
+        self.reader = reader
+        self.writer = writer
+        self.frame_message = frame_message(sensor_count)
+
+    @classmethod
+    async def connect(cls, host="127.0.0.1", port=DEFAULT_TCP_PORT, sensor_count=len(DEFAULT_LAYOUT)):
+        """Connects to a server, sensor_count must match the sensor layout of the server"""
+        return cls(*await asyncio.open_connection(host, port), sensor_count)
+
+    async def frames(self):
+        """Frames of the server as (sequence number, Frame) pairs, the frames have no car position and speed"""
+        try:
+            while True:
+                sequence, step_time, *values = self.frame_message.unpack(
+                    await self.reader.readexactly(self.frame_message.size))
+                yield sequence, Frame(step_time, None, None, values)
+        except asyncio.IncompleteReadError:
+            return
+
+    def send_speed(self, sequence, speed):
+        self.writer.write(COMMAND_MESSAGE.pack(sequence, speed))
+
+    def close(self):
+        self.writer.close()
+
+
+async def run_control_client(client, control, limit=None):
+    """Answers the frames of the server with the speed of the control, returns the number of answered frames"""
+    count = 0
+    async for sequence, frame in client.frames():
+        control.input = control_input(frame, len(frame.values) // 3)
+        client.send_speed(sequence, control.get_speed())
+        count += 1
+        if count == limit:
+            break
+    return count
+
+
+async def serve(model, args):
+    server = BridgeServer(model, args.car_speed, 1 / args.rate, args.initial_speed)
+    await server.start(args.host, args.tcp_port, args.udp_port)
+    tcp, udp = server.addresses()
+    print("Listening on TCP {} and UDP {}".format(tcp, udp), file=sys.stderr)
+    report = asyncio.ensure_future(report_latency(server, args.report_interval))
+    try:
+        await server.run(args.duration)
+    finally:
+        report.cancel()
+        server.close()
+        print(server.latency.summary(), file=sys.stderr)
+
+
+async def report_latency(server, interval):
+    while True:
+        await asyncio.sleep(interval)
+        print(server.latency.summary(), file=sys.stderr)
+
+
+async def client_main(args):
+    layout = load_layout(args.layout) if args.layout else DEFAULT_LAYOUT
+    client = await BridgeClient.connect(args.host, args.tcp_port, len(layout))
+    try:
+        await run_control_client(client, Control())
+    finally:
+        client.close()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Serves the simulation to a control running in another process")
+    parser.add_argument("--scenario", help="scenario JSON file or binary library")
+    parser.add_argument("--index", type=int, default=0, help="index of the scenario in the file")
+    parser.add_argument("--layout", help="sensor layout JSON file (see sensor_layout.py), default: the 6 front sensors")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--tcp-port", type=int, default=DEFAULT_TCP_PORT)
+    parser.add_argument("--udp-port", type=int, default=DEFAULT_UDP_PORT)
+    parser.add_argument("--rate", type=float, default=SIMULATION_RATE, help="steps per second (default: 1000)")
+    parser.add_argument("--car-speed", type=float, default=1.0, help="speed of the car at full speed [m/s]")
+    parser.add_argument("--initial-speed", type=float, default=0.0, help="speed until the first command (0..1)")
+    parser.add_argument("--duration", type=float, help="simulated time [s] (default: forever)")
+    parser.add_argument("--report-interval", type=float, default=5.0, help="latency report interval [s]")
+    parser.add_argument("--client", action="store_true",
+                        help="run the built-in control as a TCP client of a running server instead")
+    args = parser.parse_args(argv)
+
+    try:
+        if args.client:
+            asyncio.run(client_main(args))
+        else:
+            layout = load_layout(args.layout) if args.layout else None
+            model = scenario.load_scenario(args.scenario, args.index).model(layout) if args.scenario \
+                else simulation.Model(layout)
+            asyncio.run(serve(model, args))
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,237 @@
+import math
+
+import gui_model
+from spatial_index import GridIndex
+
+""" Edge length of the broadphase grid cells [px] """
+COLLISION_CELL_SIZE = 64
+""" Shapes closer than this are not colliding [px], touching shapes do not share a pixel of their masks """
+COLLISION_TOLERANCE = 1e-9
+
+
+def sprite_shape(sprite):
+    """Collision shape of a sprite: ("polygon", corner points) or ("circle", center, radius)"""
+    if isinstance(sprite, gui_model.CircleObject):
+        return "circle", sprite.gui_pos, sprite.radius
+    if isinstance(sprite, gui_model.RectangleObject):
+        return "polygon", sprite.points
+    """The car and any other sprite collide with their rectangle"""
+    rect = sprite.rect
+    return "polygon", [rect.topleft, rect.topright, rect.bottomright, rect.bottomleft]
+
+
+def sprite_box(sprite):
+    """Bounding box of the sprite with a pixel margin for the truncated coordinates of the rect"""
+    rect = sprite.rect
+    return rect.left - 1, rect.top - 1, rect.right + 1, rect.bottom + 1
+
+
+def polygon_axes(points):
+    """Normals of the edges of a polygon"""
+    return [(points[i - 1][1] - points[i][1], points[i][0] - points[i - 1][0]) for i in range(len(points))]
+
+
+def polygon_projection(points, axis):
+    """Interval of the polygon projected onto the axis"""
+    values = [point[0] * axis[0] + point[1] * axis[1] for point in points]
+    return min(values), max(values)
+
+
+def circle_projection(center, radius, axis):
+    """Interval of the circle projected onto the axis"""
+    value = center[0] * axis[0] + center[1] * axis[1]
+    extent = radius * math.hypot(axis[0], axis[1])
+    return value - extent, value + extent
+
+
+def separated(interval1, interval2, axis):
+    """Are the projected intervals apart (or only touching) on the axis"""
+    tolerance = COLLISION_TOLERANCE * math.hypot(axis[0], axis[1])
+    return interval1[1] <= interval2[0] + tolerance or interval2[1] <= interval1[0] + tolerance
+
+
+def polygons_overlap(points1, points2):
+    """Separating axis test of two convex polygons"""
+    for axis in polygon_axes(points1) + polygon_axes(points2):
+        if axis != (0, 0) and separated(polygon_projection(points1, axis), polygon_projection(points2, axis), axis):
+            return False
+    return True
+
+
+def polygon_circle_overlap(points, center, radius):
+    """Separating axis test of a convex polygon and a circle,
+    the axes are the edge normals and the direction of the closest corner from the center"""
+    closest = min(points, key=lambda point: (point[0] - center[0]) ** 2 + (point[1] - center[1]) ** 2)
+    for axis in polygon_axes(points) + [(closest[0] - center[0], closest[1] - center[1])]:
+        if axis != (0, 0) and separated(polygon_projection(points, axis), circle_projection(center, radius, axis),
+                                        axis):
+            return False
+    return True
+
+
+def circles_overlap(center1, radius1, center2, radius2):
+    return math.hypot(center1[0] - center2[0], center1[1] - center2[1]) < radius1 + radius2 - COLLISION_TOLERANCE
+
+
+def shapes_overlap(shape1, shape2):
+    """Do two collision shapes of sprite_shape overlap"""
+    if shape1[0] == "polygon":
+        if shape2[0] == "polygon":
+            return polygons_overlap(shape1[1], shape2[1])
+        return polygon_circle_overlap(shape1[1], shape2[1], shape2[2])
+    if shape2[0] == "polygon":
+        return polygon_circle_overlap(shape2[1], shape1[1], shape1[2])
+    return circles_overlap(shape1[1], shape1[2], shape2[1], shape2[2])
+
+
+def polygons_sweep(points1, motion, points2):
+    """Separating axis test of a convex polygon moved by motion and a fixed one: on every axis the projections
+    overlap for an interval of the move, the polygons overlap where all intervals do.
+    Returns the first time (0..1) of the move at which they overlap, None if they do not"""
+    first, last = 0.0, 1.0
+    for axis in polygon_axes(points1) + polygon_axes(points2):
+        if axis == (0, 0):
+            continue
+        interval1 = polygon_projection(points1, axis)
+        interval2 = polygon_projection(points2, axis)
+        velocity = motion[0] * axis[0] + motion[1] * axis[1]
+        if velocity == 0:
+            if separated(interval1, interval2, axis):
+                return None
+            continue
+        tolerance = COLLISION_TOLERANCE * math.hypot(axis[0], axis[1])
+        """Times at which the projections start and stop touching"""
+        touch1 = (interval2[0] + tolerance - interval1[1]) / velocity
+        touch2 = (interval2[1] - tolerance - interval1[0]) / velocity
+        first = max(first, min(touch1, touch2))
+        last = min(last, max(touch1, touch2))
+        if first >= last:
+            return None
+    return first
+
+
+def point_circle_sweep(start, motion, center, radius):
+    """First time (0..1) at which the point moved by motion from start is inside the circle, None if never"""
+    dx, dy = start[0] - center[0], start[1] - center[1]
+    c = dx ** 2 + dy ** 2 - radius ** 2
+    if c < 0:
+        return 0.0
+    a = motion[0] ** 2 + motion[1] ** 2
+    b = dx * motion[0] + dy * motion[1]
+    if a == 0 or b >= 0 or b ** 2 - a * c <= 0:
+        return None
+    time = (-b - math.sqrt(b ** 2 - a * c)) / a
+    return time if time <= 1 else None
+
+
+def polygon_circle_sweep(points, center, motion, radius):
+    """First time (0..1) at which a circle moved by motion overlaps a fixed convex polygon, None if never.
+    The center moves into the polygon grown by the radius: the edges moved out by the radius and circles at the
+    corners."""
+    if polygon_circle_overlap(points, center, radius):
+        return 0.0
+    radius -= COLLISION_TOLERANCE
+    centroid = (sum(point[0] for point in points) / len(points), sum(point[1] for point in points) / len(points))
+    first = None
+    for i in range(len(points)):
+        start, end = points[i - 1], points[i]
+        length = math.hypot(end[0] - start[0], end[1] - start[1])
+        if length == 0:
+            continue
+        normal = ((end[1] - start[1]) / length, (start[0] - end[0]) / length)
+        if normal[0] * (centroid[0] - start[0]) + normal[1] * (centroid[1] - start[1]) > 0:
+            normal = (-normal[0], -normal[1])
+        velocity = motion[0] * normal[0] + motion[1] * normal[1]
+        if velocity >= 0:
+            continue
+        time = (radius - (center[0] - start[0]) * normal[0] - (center[1] - start[1]) * normal[1]) / velocity
+        if time < 0 or time > 1 or (first is not None and time >= first):
+            continue
+        """The contact point has to be on the edge, otherwise a corner is hit first"""
+        offset = ((center[0] + motion[0] * time - start[0]) * (end[0] - start[0]) +
+                  (center[1] + motion[1] * time - start[1]) * (end[1] - start[1])) / length
+        if 0 <= offset <= length:
+            first = time
+    for point in points:
+        time = point_circle_sweep(center, motion, point, radius)
+        if time is not None and (first is None or time < first):
+            first = time
+    return first
+
+
+def shapes_sweep(shape1, motion, shape2):
+    """First time (0..1) at which the collision shape moved by motion overlaps the fixed one, None if never.
+    At that time the shapes only touch, so the shape can be moved that far."""
+    if shape1[0] == "polygon":
+        if shape2[0] == "polygon":
+            return polygons_sweep(shape1[1], motion, shape2[1])
+        """The polygon moving onto the circle is the circle moving the other way"""
+        return polygon_circle_sweep(shape1[1], shape2[1], (-motion[0], -motion[1]), shape2[2])
+    if shape2[0] == "polygon":
+        return polygon_circle_sweep(shape2[1], shape1[1], motion, shape1[2])
+    if circles_overlap(shape1[1], shape1[2], shape2[1], shape2[2]):
+        return 0.0
+    return point_circle_sweep(shape1[1], motion, shape2[1], shape1[2] + shape2[2] - COLLISION_TOLERANCE)
+
+
+class CollisionIndex:
+    """Broadphase grid of the sprite rectangles with an exact shape test of the candidates.
+    The grid is rebuilt when a sprite is added, removed or moved, except the sprite being tested:
+    a sprite that is moved and tested many times (the car of the animation) does not cause rebuilds."""
+
+    def __init__(self, cell_size=COLLISION_CELL_SIZE):
+        self.grid = GridIndex(cell_size)
+        self.sprites = []
+        self.rects = []
+
+    def sync(self, sprites, moving=None):
+        """Rebuilds the grid if the sprites changed, the rectangle of the moving sprite is not checked"""
+        if len(sprites) == len(self.sprites) and \
+                all(sprite is indexed and (sprite.rect is rect or sprite is moving)
+                    for sprite, indexed, rect in zip(sprites, self.sprites, self.rects)):
+            return
+        self.grid.clear()
+        self.sprites = list(sprites)
+        self.rects = [sprite.rect for sprite in sprites]
+        for sprite in sprites:
+            self.grid.insert(sprite, sprite_box(sprite))
+
+    def is_colliding(self, sprite, sprites):
+        """Is the sprite colliding with any other sprite of the list"""
+        self.sync(sprites, sprite)
+        shape = None
+        for other in self.grid.query(sprite_box(sprite)):
+            if other is sprite:
+                continue
+            if shape is None:
+                shape = sprite_shape(sprite)
+            if shapes_overlap(shape, sprite_shape(other)):
+                return True
+        return False
+
+    def sweep(self, sprite, motion, sprites, shape=None):
+        """Part of the move (0..1) the sprite can make by motion [px] before it touches another sprite of the list.
+        The shape is the collision shape of the sprite at the start (default: sprite_shape), thin sprites are not
+        skipped by a long move."""
+        self.sync(sprites, sprite)
+        box = sprite_box(sprite)
+        box = (box[0] + min(motion[0], 0), box[1] + min(motion[1], 0),
+               box[2] + max(motion[0], 0), box[3] + max(motion[1], 0))
+        first = 1.0
+        for other in self.grid.query(box):
+            if other is sprite:
+                continue
+            if shape is None:
+                shape = sprite_shape(sprite)
+            time = shapes_sweep(shape, motion, sprite_shape(other))
+            if time is not None and time < first:
+                first = time
+        return first
+
+    def sprite_at(self, point, sprites):
+        """Topmost sprite of the list (the last one drawn) under the point, None if there is none"""
+        self.sync(sprites)
+        for sprite in reversed(self.grid.query((point[0], point[1], point[0], point[1]))):
+            if sprite.is_clicked(point):
+                return sprite
+        return None
@@ -20,3 +20,42 @@ def gui_to_sim_circle(map_height_px, gui_circle: gui_model.CircleObject) -> simu
         (gui_circle.gui_pos[0] * GUIConstants.PX_TO_M, (map_height_px - gui_circle.gui_pos[1]) * GUIConstants.PX_TO_M),
         gui_circle.radius * GUIConstants.PX_TO_M
     )
+
+
+class SceneSync:
+    """Keeps one simulation object for every obstacle sprite of the GUI,
+    the simulation object is only rebuilt when its sprite is created, moved, rotated or removed"""
+
+    def __init__(self, map_height_px):
+        self.map_height_px = map_height_px
+        self.sprites = []
+        self.objects = {}
+        self.rect_list = []
+        self.circle_list = []
+
+    def sync(self, sprites):
+        """Updates the simulation objects from the sprites, returns True if anything changed"""
+        changed = len(sprites) != len(self.sprites)
+        for i, sprite in enumerate(sprites):
+            if not changed and sprite is not self.sprites[i]:
+                changed = True
+            if isinstance(sprite, gui_model.CircleObject):
+                pose = (sprite.gui_pos, sprite.radius)
+                if sprite not in self.objects or self.objects[sprite][0] != pose:
+                    self.objects[sprite] = (pose, gui_to_sim_circle(self.map_height_px, sprite))
+                    changed = True
+            elif isinstance(sprite, gui_model.RectangleObject):
+                pose = (sprite.gui_pos, sprite.rot, sprite.width, sprite.height)
+                if sprite not in self.objects or self.objects[sprite][0] != pose:
+                    self.objects[sprite] = (pose, gui_to_sim_rect(self.map_height_px, sprite))
+                    changed = True
+
+        if changed:
+            self.sprites = list(sprites)
+            for sprite in [sprite for sprite in self.objects if sprite not in sprites]:
+                del self.objects[sprite]
+            self.rect_list = [self.objects[sprite][1] for sprite in sprites
+                              if isinstance(sprite, gui_model.RectangleObject)]
+            self.circle_list = [self.objects[sprite][1] for sprite in sprites
+                                if isinstance(sprite, gui_model.CircleObject)]
+        return changed
@@ -0,0 +1,78 @@
+""" Rate of the simulation and the control [Hz] """
+SIMULATION_RATE = 1000
+""" Most fixed steps run by one FixedStepLoop.advance call, the rest of the time is dropped if the CPU falls behind """
+MAX_STEPS_PER_ADVANCE = 250
+
+
+class FixedStepLoop:
+    """Runs Model.step and Control.get_speed on a fixed time step, independent of the render rate.
+    The car moves along the x axis with car_speed [m/s] times the speed of the control.
+    can_move(car_pos) is asked before every move, the car stays in place if it returns False.
+    clip_move(car_pos, new_car_pos) replaces it if given and returns how far the car gets towards the new position,
+    e.g. the point of contact of a swept collision test, so long steps do not pass through obstacles.
+    Every step is added to the recorder (recording.Recorder) if one is given.
+    """
+
+    def __init__(self, model, control, car_speed, time_step=1 / SIMULATION_RATE, can_move=None, recorder=None,
+                 clip_move=None):
+        self.model = model
+        self.control = control
+        self.car_speed = car_speed
+        self.time_step = time_step
+        self.can_move = can_move
+        self.clip_move = clip_move
+        self.recorder = recorder
+        self.time = 0.0
+        self.accumulator = 0.0
+        self.previous_car_pos = model.car_pos
+        self.speed = control.output
+
+    def step(self):
+        """Runs one fixed time step: simulation, control, then the move of the car"""
+        self.model.step()
+        self.control.input.clear()
+        for sensor in self.model.sensor_list:
+            self.control.input.append(sensor.direct_val)
+            self.control.input.append(sensor.cross_val_r)
+            self.control.input.append(sensor.cross_val_l)
+        self.speed = self.control.get_speed()
+        if self.recorder is not None:
+            self.recorder.record(self.time, self.model.car_pos, self.model, self.speed)
+
+        self.previous_car_pos = self.model.car_pos
+        car_pos = (self.model.car_pos[0] + self.speed * self.car_speed * self.time_step, self.model.car_pos[1])
+        if car_pos != self.model.car_pos:
+            if self.clip_move is not None:
+                self.model.car_pos = self.clip_move(self.model.car_pos, car_pos)
+            elif self.can_move is None or self.can_move(car_pos):
+                self.model.car_pos = car_pos
+        self.time += self.time_step
+
+    def advance(self, elapsed):
+        """Runs the fixed steps that fit into the elapsed real time [s],
+        returns how far the current time is between the last two steps (0..1) for interpolated rendering"""
+        self.accumulator += elapsed
+        steps = 0
+        while self.accumulator >= self.time_step:
+            if steps == MAX_STEPS_PER_ADVANCE:
+                self.accumulator = 0.0
+                break
+            self.step()
+            self.accumulator -= self.time_step
+            steps += 1
+        return self.accumulator / self.time_step
+
+    def interpolated_car_pos(self, alpha):
+        """Car position between the last two steps for rendering"""
+        return (self.previous_car_pos[0] + (self.model.car_pos[0] - self.previous_car_pos[0]) * alpha,
+                self.previous_car_pos[1] + (self.model.car_pos[1] - self.previous_car_pos[1]) * alpha)
+
+    def run(self, duration):
+        """Runs the loop for the given simulated duration [s] as fast as the CPU allows"""
+        for _ in range(round(duration / self.time_step)):
+            self.step()
+
+    def reset(self):
+        """Starts from the current car position of the model, e.g. after the car was dragged"""
+        self.accumulator = 0.0
+        self.previous_car_pos = self.model.car_pos
@@ -11,11 +11,22 @@ from control import Control
 from size_picker import SizePicker
 import simulation
 import conversion
+import recording
+from fixed_step import FixedStepLoop
+from collision import CollisionIndex
+from profiling import PROFILER
+from text_cache import get_font
+
+""" The profiling overlay is rendered again every this many frames """
+PROFILE_OVERLAY_INTERVAL = 10
+PROFILE_OVERLAY_FONT_SIZE = 18
 
 
 class GUI:
-    def __init__(self):
-        """Initializes the window of the application and the class variables"""
+    def __init__(self, recorder=None, replay=None, profile=False):
+        """Initializes the window of the application and the class variables,
+        the drive is written to the recorder (recording.Recorder) or replayed from a recording.Recording.
+        With profile, the phases are timed from the start, otherwise only while the overlay is shown (F3)."""
         pygame.init()
         pygame.font.init()
         self.screen = pygame.display.set_mode((1280, 720))
@@ -39,14 +50,23 @@ class GUI:
                                (0 + GUIConstants.BUTTON_MARGIN, self.height * 0.5 + 4 * GUIConstants.BUTTON_MARGIN + 3 *
                                 button_height))
 
+        """Init simulation, the car sprite and the table are built for the sensor layout of the model"""
+        self.replay = replay
+        if replay is not None:
+            self.model = recording.ReplayModel(replay)
+        else:
+            self.model = simulation.Model(occlusion=True)
+
         self.data_table = Table(self.screen, (self.play_btn.rect.width + 2 * GUIConstants.BUTTON_MARGIN,
-                                              self.height * 0.5 + GUIConstants.BUTTON_MARGIN))
+                                              self.height * 0.5 + GUIConstants.BUTTON_MARGIN),
+                                len(self.model.sensor_list), self.height * 0.5 - 2 * GUIConstants.BUTTON_MARGIN)
 
+        GUIConstants.PX_TO_M = 2.2/(self.width * 0.075)
         self.car = gui_model.CarObject(self.screen,
                                        (300, self.height * 0.25 - self.width * 0.075 / 2),
                                        self.width * 0.15,
-                                       self.width * 0.075)
-        GUIConstants.PX_TO_M = 2.2/(self.width * 0.075)
+                                       self.width * 0.075,
+                                       self.model.layout)
 
         self.left_border = gui_model.RectangleObject(self.screen, (-5, 0), 0, 10, self.height * 0.5 - 1)
         self.right_border = gui_model.RectangleObject(self.screen, (self.width - 5, 0), 0, 10, self.height * 0.5 - 1)
@@ -74,27 +94,52 @@ class GUI:
         self.is_running = False
         self.clock = pygame.time.Clock()
 
-        """Init simulation"""
-        self.model = simulation.Model()
+        """Drawing state: the rendered dashboard and what is shown on the game map"""
+        self.map_rect = pygame.Rect(0, 0, self.width, self.height * 0.5)
+        self.dashboard_layer = None
+        self.drawn_map_state = None
+        """Screen areas of the objects and the objects dragged in the last frame, to update the areas they move in"""
+        self.sprite_rects = {}
+        self.dragged = set()
+
+        """Profiling overlay on the game map, toggled by F3, its text is refreshed every few frames"""
+        self.profile = profile
+        PROFILER.enabled = profile
+        self.show_profile = False
+        self.profile_layer = None
+        self.profile_frame = 0
+
+        """Collision detection of the sprites"""
+        self.collision = CollisionIndex()
+
+        self.scene = conversion.SceneSync(self.height * 0.5)
 
         """Init control"""
         self.control = Control()
 
+        """The simulation and the control run on a fixed time step, the car moves width / 10 px per second"""
+        self.loop = FixedStepLoop(self.model, self.control, self.width / 10 * GUIConstants.PX_TO_M,
+                                  recorder=recorder, clip_move=self.car_clip_move)
+
     def update(self):
         """Updates the content of the window"""
-        self.screen.fill(Colors.WHITE)
-
-        self.draw_game_map()
-
         mouse_pos = pygame.mouse.get_pos()
 
         """Handle animation"""
-        if self.is_running:
-            time_delay = self.clock.get_time()
-            start_pos = self.car.gui_pos
-            self.car.set_gui_pos((start_pos[0] + time_delay / 10000 * self.width * self.control.get_speed(), 0))
-            if self.is_colliding_any(self.car):
-                self.car.set_gui_pos(start_pos)
+        if self.is_running and not self.car.is_dragged:
+            with PROFILER.phase("GUI.animation"):
+                if self.replay is not None:
+                    """The recorded frames drive the table, the sensor colors and the control"""
+                    self.model.advance(self.clock.get_time() / 1000)
+                    self.model.step()
+                    self.control.input = recording.control_input(self.model.frame, self.replay.sensor_count)
+                    self.control.get_speed()
+                    car_pos = self.model.car_pos
+                else:
+                    self.sync_simulation()
+                    alpha = self.loop.advance(self.clock.get_time() / 1000)
+                    car_pos = self.loop.interpolated_car_pos(alpha)
+                self.car.set_gui_pos((car_pos[0] / GUIConstants.PX_TO_M, 0))
 
         """Handle the occurred events"""
         for event in pygame.event.get():
@@ -102,6 +147,9 @@ class GUI:
                 pygame.quit()
                 sys.exit(0)
 
+            elif event.type == pygame.KEYDOWN and event.key == pygame.K_F3:
+                self.toggle_profile()
+
             elif event.type == pygame.MOUSEBUTTONDOWN and event.button == 1:
                 """Button clicks"""
                 if self.exit_btn.rect.collidepoint(mouse_pos):
@@ -112,6 +160,7 @@ class GUI:
                 if self.play_btn.rect.collidepoint(mouse_pos):
                     """Start animation"""
                     self.is_running = True
+                    self.sync_car()
 
                 if self.stop_btn.rect.collidepoint(mouse_pos):
                     """Stop animation"""
@@ -121,6 +170,9 @@ class GUI:
                     """Reset the obstacles"""
                     self.sprites.clear()
                     self.car.set_gui_pos((300, 0))
+                    self.sync_car()
+                    if self.replay is not None:
+                        self.model.rewind()
                     self.sprites = [self.car, self.left_border, self.right_border]
                     self.rectangle_objects = [self.left_border, self.right_border]
 
@@ -128,6 +180,7 @@ class GUI:
                 for i in range(len(self.size_picker.rectangles)):
                     if self.size_picker.rectangles[i].collidepoint(mouse_pos):
                         self.size_picker.set_selected(i + 1)
+                        self.dashboard_layer = None
 
                 """If the drag in are was clicked then add a new drag and drop element simulation"""
                 if self.drag_in_circle.is_clicked(mouse_pos):
@@ -148,11 +201,9 @@ class GUI:
                     self.sprites.append(ro)
 
                 """Check the draggable components"""
-                for sprite in self.sprites:
-                    if sprite in [self.left_border, self.right_border]:
-                        continue
-                    if sprite.is_clicked(mouse_pos):
-                        sprite.set_dragged(sprite.gui_pos)
+                sprite = self.collision.sprite_at(mouse_pos, self.sprites)
+                if sprite is not None and sprite not in [self.left_border, self.right_border]:
+                    sprite.set_dragged(sprite.gui_pos)
 
             elif event.type == pygame.MOUSEBUTTONUP and event.button == 1:
                 """Release dragged components"""
@@ -169,38 +220,28 @@ class GUI:
 
             elif event.type == pygame.MOUSEBUTTONDOWN and event.button in [4, 5]:
                 """Rotate the rectangle objects with the mouse wheel (+/- 5 degrees)"""
-                for rectangle_object in self.rectangle_objects:
-                    if rectangle_object in [self.left_border, self.right_border]:
-                        continue
-                    if rectangle_object.is_clicked(mouse_pos):
-                        start_rot = rectangle_object.rot
-                        if event.button == 4:
-                            rectangle_object.set_rot((rectangle_object.rot + math.pi / 36) % (2 * math.pi))
-                        elif event.button == 5:
-                            rectangle_object.set_rot((rectangle_object.rot - math.pi / 36) % (2 * math.pi))
-                        if self.is_colliding_any(rectangle_object) or \
-                                rectangle_object.is_colliding(self.dashboard_container):
-                            rectangle_object.set_rot(start_rot)
-
-        """Draw dashboard"""
-        self.draw_dashboard()
-
-        """Simulation update"""
-        sim_rectangles = []
-        sim_circles = []
-        for sprite in self.sprites:
-            if isinstance(sprite, gui_model.CircleObject):
-                sim_circles.append(conversion.gui_to_sim_circle(self.height * 0.5, sprite))
-            elif isinstance(sprite, gui_model.RectangleObject):
-                sim_rectangles.append(conversion.gui_to_sim_rect(self.height * 0.5, sprite))
-
-        self.model.rect_list = sim_rectangles
-        self.model.circle_list = sim_circles
-        self.model.car_pos = (self.car.gui_pos[0] * GUIConstants.PX_TO_M,
-                              (self.height*0.5 - self.car.gui_pos[1]) * GUIConstants.PX_TO_M)
-        self.model.step()
-
-        """Draw objects"""
+                rectangle_object = self.collision.sprite_at(mouse_pos, self.sprites)
+                if isinstance(rectangle_object, gui_model.RectangleObject) and \
+                        rectangle_object not in [self.left_border, self.right_border]:
+                    start_rot = rectangle_object.rot
+                    if event.button == 4:
+                        rectangle_object.set_rot((rectangle_object.rot + GUIConstants.ROTATION_STEP)
+                                                 % (2 * math.pi))
+                    elif event.button == 5:
+                        rectangle_object.set_rot((rectangle_object.rot - GUIConstants.ROTATION_STEP)
+                                                 % (2 * math.pi))
+                    if self.is_colliding_any(rectangle_object) or \
+                            rectangle_object.is_colliding(self.dashboard_container):
+                        rectangle_object.set_rot(start_rot)
+
+        """Simulation update, while the animation runs the car is moved by the fixed step loop"""
+        with PROFILER.phase("GUI.simulation"):
+            self.sync_simulation()
+            if not self.is_running or self.car.is_dragged:
+                self.sync_car()
+            self.model.step()
+
+        """Move the dragged objects"""
         for sprite in self.sprites:
             if sprite.is_dragged:
                 sprite.set_gui_pos(mouse_pos)
@@ -210,6 +251,139 @@ class GUI:
                         sprite.set_gui_pos(sprite.pick_up_pos)
                     else:
                         sprite.set_dragged(sprite.gui_pos)
+
+        """Sensor colors"""
+        for sensor in self.model.sensor_list:
+            self.car.sensors[sensor.index].set_color([sensor.direct_val, sensor.cross_val_l, sensor.cross_val_r])
+
+        """Redraw everything if the dashboard changed, otherwise only the changed parts: the game map, the areas the
+        dragged objects left and entered (also over the dashboard) and the table cells"""
+        full_redraw = self.dashboard_layer is None
+        sprite_rects = {sprite: self.drawn_rect(sprite) for sprite in self.sprites}
+        dragged = {sprite for sprite in self.sprites if sprite.is_dragged}
+        moving = self.dragged | dragged
+        drag_areas = []
+        for sprite in moving:
+            old_rect, rect = self.sprite_rects.get(sprite), sprite_rects.get(sprite)
+            if old_rect != rect:
+                drag_areas += [area.inflate(2 * GUIConstants.DRAG_REDRAW_MARGIN, 2 * GUIConstants.DRAG_REDRAW_MARGIN)
+                               .clip(self.screen.get_rect()) for area in (old_rect, rect) if area is not None]
+        self.sprite_rects = sprite_rects
+        self.dragged = dragged
+        dirty_rects = []
+        if self.show_profile:
+            self.update_profile_layer()
+
+        with PROFILER.phase("GUI.draw"):
+            if full_redraw:
+                self.draw_dashboard()
+            else:
+                for area in drag_areas:
+                    self.restore_dashboard(area)
+
+            """If only the dragged objects moved, the game map is drawn but only the areas under them are updated"""
+            map_state = self.map_state()
+            if full_redraw or drag_areas or map_state != self.drawn_map_state:
+                self.draw_objects()
+                if full_redraw or without_sprites(map_state, moving) != without_sprites(self.drawn_map_state, moving):
+                    dirty_rects.append(self.map_rect)
+                self.drawn_map_state = map_state
+            dirty_rects += drag_areas
+
+        if self.show_profile:
+            self.screen.blit(self.profile_layer, self.map_rect.topleft)
+            dirty_rects.append(self.profile_layer.get_rect(topleft=self.map_rect.topleft))
+
+        """Get sensor values"""
+        with PROFILER.phase("GUI.table"):
+            dirty_rects += self.draw_table(full_redraw, drag_areas)
+
+        with PROFILER.phase("GUI.wait"):
+            self.clock.tick(30)
+        with PROFILER.phase("GUI.display"):
+            if full_redraw:
+                pygame.display.update()
+            elif dirty_rects:
+                pygame.display.update(dirty_rects)
+        PROFILER.end_frame()
+
+    def draw_table(self, force=False, areas=()):
+        """Draws the changed sensor values into the table, all of them with force and the ones in the given areas of
+        the screen, returns the updated cells"""
+        dirty_rects = []
+        for i, sensor in enumerate(self.model.sensor_list):
+            for column, value in enumerate([sensor.direct_val, sensor.cross_val_l, sensor.cross_val_r]):
+                cell = self.data_table.cell_rect(column + 1, i + 1)
+                rect = self.data_table.draw_value(column + 1, i + 1, value, force or cell.collidelist(areas) >= 0)
+                if rect:
+                    dirty_rects.append(rect)
+        return dirty_rects
+
+    def drawn_rect(self, sprite):
+        """Screen area the sprite draws into, the car also draws the beams of its sensors"""
+        if sprite is not self.car:
+            return sprite.rect.copy()
+        return sprite.rect.unionall([pygame.Rect(sensor.gui_pos[0] - sensor.beam_radius,
+                                                 sensor.gui_pos[1] - sensor.beam_radius,
+                                                 2 * sensor.beam_radius, 2 * sensor.beam_radius)
+                                     for sensor in sprite.sensors])
+
+    def restore_dashboard(self, area):
+        """Copies the rendered dashboard back into the area of the screen, where a dragged object was drawn over it"""
+        part = area.clip(self.dashboard_container.rect)
+        if part:
+            self.screen.blit(self.dashboard_layer, part, part.move(-self.dashboard_container.rect.x,
+                                                                   -self.dashboard_container.rect.y))
+
+    def toggle_profile(self):
+        """Shows or hides the profiling overlay, without the profile option the phases are only timed while it is
+        shown"""
+        self.show_profile = not self.show_profile
+        PROFILER.enabled = self.profile or self.show_profile
+        self.profile_layer = None
+        self.profile_frame = 0
+        """The game map under the overlay is drawn again"""
+        self.drawn_map_state = None
+
+    def update_profile_layer(self):
+        """Renders the overlay every PROFILE_OVERLAY_INTERVAL frames: the frame rate and the mean time of every phase
+        and count of every counter per frame, the map is drawn again under it if its size changes"""
+        self.profile_frame += 1
+        if self.profile_layer is not None and self.profile_frame % PROFILE_OVERLAY_INTERVAL:
+            return
+        with PROFILER.phase("GUI.overlay"):
+            times, counts = PROFILER.averages()
+            rows = [("FPS (F3 hides)", "{:.1f}".format(PROFILER.fps()))]
+            rows += [(name, "{:.2f} ms".format(value * 1000)) for name, value in times.items()]
+            rows += [(name, "{:.1f}".format(value)) for name, value in counts.items()]
+            font = get_font(PROFILE_OVERLAY_FONT_SIZE)
+            images = [(font.render(name, True, Colors.WHITE), font.render(value, True, Colors.WHITE))
+                      for name, value in rows]
+            name_width = max(name.get_width() for name, _ in images)
+            value_width = max(value.get_width() for _, value in images)
+            line_height = font.get_linesize()
+            padding = GUIConstants.BUTTON_PADDING
+            layer = pygame.Surface((name_width + value_width + 4 * padding, len(images) * line_height + 2 * padding))
+            layer.fill(Colors.BLACK)
+            for i, (name, value) in enumerate(images):
+                y = padding + i * line_height
+                layer.blit(name, (padding, y))
+                layer.blit(value, (layer.get_width() - padding - value.get_width(), y))
+            if self.profile_layer is not None and self.profile_layer.get_size() != layer.get_size():
+                self.drawn_map_state = None
+            self.profile_layer = layer
+
+    def map_state(self):
+        """Everything that is drawn on the game map, to detect if it has to be redrawn"""
+        return ([(sprite, tuple(sprite.rect), getattr(sprite, "rot", None)) for sprite in self.sprites],
+                self.model.direct_list,
+                self.model.cross_list,
+                [sensor.color for sensor in self.car.sensors])
+
+    def draw_objects(self):
+        """Draws the game map with the objects, the echoes and the sensors"""
+        self.draw_game_map()
+        for sprite in self.sprites:
             sprite.draw()
 
         """Get cross echo list"""
@@ -236,27 +410,57 @@ class GUI:
                               self.height * 0.5 - (direct[1][1] / GUIConstants.PX_TO_M)),
                              3)
 
-        """Get sensor values"""
-        self.control.input.clear()
-        for i, sensor in enumerate(self.model.sensor_list):
-            self.control.input.append(sensor.direct_val)
-            self.control.input.append(sensor.cross_val_r)
-            self.control.input.append(sensor.cross_val_l)
-            self.car.sensors[sensor.index].set_color([sensor.direct_val, sensor.cross_val_l, sensor.cross_val_r])
-            self.data_table.draw_value(1, i + 1, sensor.direct_val)
-            self.data_table.draw_value(2, i + 1, sensor.cross_val_l)
-            self.data_table.draw_value(3, i + 1, sensor.cross_val_r)
+        """Sensors on top of the echoes"""
+        for sensor in self.car.sensors:
+            sensor.draw()
+
+    def sync_simulation(self):
+        """Updates the obstacles of the simulation from the sprites"""
+        self.scene.sync(self.sprites)
+        self.model.rect_list = self.scene.rect_list
+        self.model.circle_list = self.scene.circle_list
 
-        self.clock.tick(30)
-        pygame.display.update()
+    def sync_car(self):
+        """Moves the simulated car to the car sprite and restarts the fixed step loop from there"""
+        self.model.car_pos = (self.car.gui_pos[0] * GUIConstants.PX_TO_M,
+                              (self.height*0.5 - self.car.gui_pos[1]) * GUIConstants.PX_TO_M)
+        self.loop.reset()
+
+    def car_clip_move(self, car_pos, new_car_pos):
+        """Moves the car sprite from the simulation position towards the new one until it touches another sprite,
+        returns the position it gets to. The swept test uses the exact x position of the car, its rectangle is
+        truncated to pixels, so the car stays in place if the rectangle at the contact would still collide."""
+        start_pos = self.car.gui_pos
+        x = car_pos[0] / GUIConstants.PX_TO_M
+        self.car.gui_pos = (x, start_pos[1])
+        self.car.calculate_rect()
+        top, bottom = self.car.rect.top, self.car.rect.bottom
+        shape = "polygon", [(x - self.car.width, top), (x, top), (x, bottom), (x - self.car.width, bottom)]
+        with PROFILER.phase("GUI.collision"):
+            part = self.collision.sweep(self.car, (new_car_pos[0] / GUIConstants.PX_TO_M - x, 0), self.sprites, shape)
+        end_pos = (car_pos[0] + (new_car_pos[0] - car_pos[0]) * part, car_pos[1])
+        colliding = False
+        if part < 1:
+            self.car.gui_pos = (end_pos[0] / GUIConstants.PX_TO_M, start_pos[1])
+            self.car.calculate_rect()
+            colliding = self.is_colliding_any(self.car)
+        self.car.gui_pos = start_pos
+        self.car.calculate_rect()
+        return car_pos if colliding else end_pos
 
     def draw_game_map(self):
         """Draws the game map of the gui"""
-        rect = pygame.Rect(0, 0, self.width, self.height * 0.5)
-        pygame.draw.rect(self.screen, Colors.LIGHTGREY, rect)
+        pygame.draw.rect(self.screen, Colors.LIGHTGREY, self.map_rect)
 
     def draw_dashboard(self):
-        """Draws the dashboard of the gui"""
+        """Draws the dashboard of the gui, it is rendered once and copied until it changes"""
+        if self.dashboard_layer is None:
+            self.render_dashboard()
+            self.dashboard_layer = self.screen.subsurface(self.dashboard_container.rect).copy()
+        self.screen.blit(self.dashboard_layer, self.dashboard_container.rect)
+
+    def render_dashboard(self):
+        """Renders the static part of the dashboard"""
         pygame.draw.rect(self.screen, Colors.LIGHTSLATEGREY, self.dashboard_container.rect)
         self.play_btn.draw()
         self.exit_btn.draw()
@@ -273,9 +477,13 @@ class GUI:
         self.drag_in_rectangle.draw()
 
     def is_colliding_any(self, sprite):
-        """Return if the given sprite is colliding with one of the sprites in the sprite list"""
-        collision_counter = 0
-        for collide_sprite in self.sprites:
-            if sprite.is_colliding(collide_sprite):
-                collision_counter += 1
-        return collision_counter > 1
+        """Return if the given sprite is colliding with one of the other sprites in the sprite list"""
+        with PROFILER.phase("GUI.collision"):
+            return self.collision.is_colliding(sprite, self.sprites)
+
+
+def without_sprites(map_state, sprites):
+    """GUI.map_state without the entries of the given sprites, to compare the rest of the game map"""
+    if map_state is None:
+        return None
+    return ([entry for entry in map_state[0] if entry[0] not in sprites],) + map_state[1:]
@@ -1,3 +1,6 @@
+import math
+
+
 class GUIConstants:
     """Window constants"""
     WINDOW_TITLE = "Ultrasonic sensor simulation"
@@ -12,6 +15,14 @@ class GUIConstants:
     """Table constants"""
     TABLE_CELL_WIDTH = 140
     TABLE_CELL_HEIGHT = 40
+    """Smallest row height the rows of a layout with many sensors are shrunk to, the height of the text"""
+    TABLE_MIN_CELL_HEIGHT = 20
+
+    """Pixels around a dragged object that are drawn again when it moves, for its border and sensors"""
+    DRAG_REDRAW_MARGIN = 4
+
+    """Rotation of the rectangle objects by one mouse wheel step"""
+    ROTATION_STEP = math.pi / 36
 
     """Size picker constants"""
     SIZE_PICKER_SIZE = 10
@@ -4,6 +4,28 @@ import pygame
 
 from colors import Colors
 from gui_constants import GUIConstants
+from sensor_layout import DEFAULT_LAYOUT
+
+
+""" Most rectangle masks kept by rectangle_mask """
+MASK_CACHE_SIZE = 1024
+
+MASKS = {}
+
+
+def rectangle_mask(width, height, rot, rel_points, min_x, min_y):
+    """Mask of a rotated rectangle given by its corner points relative to the first corner,
+    rasterized once for every size and rotation step"""
+    key = (width, height, round(rot / GUIConstants.ROTATION_STEP, 6))
+    mask = MASKS.get(key)
+    if mask is None:
+        if len(MASKS) >= MASK_CACHE_SIZE:
+            MASKS.clear()
+        surface = pygame.Surface((max(map(lambda point: point[0], rel_points)) - min_x,
+                                  max(map(lambda point: point[1], rel_points)) - min_y), pygame.SRCALPHA)
+        pygame.draw.polygon(surface, Colors.BLACK, [(point[0] - min_x, point[1] - min_y) for point in rel_points])
+        mask = MASKS[key] = pygame.mask.from_surface(surface)
+    return mask
 
 
 class DragAndDrop(pygame.sprite.Sprite):
@@ -63,38 +85,25 @@ class RectangleObject(DragAndDrop):
         self.width = width
         self.height = height
         self.points = []
-        self.surface = None
         self.mask = None
 
         self.calculate_mask()
 
     def calculate_mask(self):
-        """Mask creation"""
-        self.points = [
-            self.gui_pos,
-            (self.width * math.cos(self.rot) + self.gui_pos[0], self.width * math.sin(self.rot) + self.gui_pos[1]),
-            (self.width * math.cos(self.rot) - self.height * math.sin(self.rot) + self.gui_pos[0],
-             self.width * math.sin(self.rot) + self.height * math.cos(self.rot) + self.gui_pos[1]),
-            (-self.height * math.sin(self.rot) + self.gui_pos[0], self.height * math.cos(self.rot) + self.gui_pos[1])
+        """Corner points, rectangle and mask, the mask only depends on the size and the rotation"""
+        rel_points = [
+            (0, 0),
+            (self.width * math.cos(self.rot), self.width * math.sin(self.rot)),
+            (self.width * math.cos(self.rot) - self.height * math.sin(self.rot),
+             self.width * math.sin(self.rot) + self.height * math.cos(self.rot)),
+            (-self.height * math.sin(self.rot), self.height * math.cos(self.rot))
         ]
+        self.points = [(point[0] + self.gui_pos[0], point[1] + self.gui_pos[1]) for point in rel_points]
 
-        min_x = min(map(lambda point: point[0], self.points))
-        max_x = max(map(lambda point: point[0], self.points))
-        width = max_x - min_x
-        min_y = min(map(lambda point: point[1], self.points))
-        max_y = max(map(lambda point: point[1], self.points))
-        height = max_y - min_y
-
-        self.surface = pygame.Surface((width, height), pygame.SRCALPHA)
-
-        self.rect = pygame.Rect(min_x, min_y, width, height)
-        pygame.draw.polygon(self.surface,
-                            Colors.BLACK,
-                            [(self.points[0][0] - min_x, self.points[0][1] - min_y),
-                             (self.points[1][0] - min_x, self.points[1][1] - min_y),
-                             (self.points[2][0] - min_x, self.points[2][1] - min_y),
-                             (self.points[3][0] - min_x, self.points[3][1] - min_y)])
-        self.mask = pygame.mask.from_surface(self.surface)
+        min_x = min(map(lambda point: point[0], rel_points))
+        min_y = min(map(lambda point: point[1], rel_points))
+        self.mask = rectangle_mask(self.width, self.height, self.rot, rel_points, min_x, min_y)
+        self.rect = pygame.Rect(min_x + self.gui_pos[0], min_y + self.gui_pos[1], *self.mask.get_size())
 
     def draw(self):
         """Draws the rectangle object"""
@@ -106,13 +115,12 @@ class RectangleObject(DragAndDrop):
         return pygame.sprite.collide_mask(self, sprite)
 
     def is_clicked(self, point):
-        """Creates a sprite element for the clicked point and checks if it is colliding with the object"""
-        click = pygame.sprite.Sprite()
-        surface = pygame.Surface((1, 1), pygame.SRCALPHA)
-        pygame.draw.rect(surface, Colors.BLACK, pygame.Rect(0, 0, 1, 1))
-        click.rect = pygame.Rect(point[0], point[1], 1, 1)
-        click.mask = pygame.mask.from_surface(surface)
-        return pygame.sprite.collide_mask(self, click)
+        """Checks if the given point is inside the rotated rectangle: on the inner side of all four edges"""
+        for i in range(4):
+            start, end = self.points[i - 1], self.points[i]
+            if (end[0] - start[0]) * (point[1] - start[1]) - (end[1] - start[1]) * (point[0] - start[0]) < 0:
+                return False
+        return True
 
     def set_gui_pos(self, pos):
         """Sets the position of the gui and its rectangle"""
@@ -126,12 +134,14 @@ class RectangleObject(DragAndDrop):
 
 
 class CarObject(DragAndDrop):
-    """Draggable car object"""
+    """Draggable car object with the sensors of a layout (sensor_layout.SensorLayout), placed by GUIConstants.PX_TO_M
+    """
 
-    def __init__(self, screen, gui_pos, width, height):
+    def __init__(self, screen, gui_pos, width, height, layout=DEFAULT_LAYOUT):
         super().__init__()
         self.screen = screen
-        self.image = pygame.transform.scale(pygame.image.load("res/car.png"), (width, height))
+        self.layout = layout
+        self.image = pygame.transform.scale(pygame.image.load("res/car.png").convert_alpha(), (width, height))
         self.width = width
         self.height = height
         self.gui_pos = gui_pos
@@ -150,13 +160,8 @@ class CarObject(DragAndDrop):
         return pygame.sprite.collide_mask(self, sprite)
 
     def is_clicked(self, point):
-        """Creates a sprite element for the clicked point and checks if it is colliding with the object"""
-        click = pygame.sprite.Sprite()
-        surface = pygame.Surface((1, 1), pygame.SRCALPHA)
-        pygame.draw.rect(surface, Colors.BLACK, pygame.Rect(0, 0, 1, 1))
-        click.rect = pygame.Rect(point[0], point[1], 1, 1)
-        click.mask = pygame.mask.from_surface(surface)
-        return pygame.sprite.collide_mask(self, click)
+        """Checks if the given point is inside the rectangle of the car"""
+        return self.rect.collidepoint(point)
 
     def set_gui_pos(self, pos):
         """Sets the position of the gui and its rectangle"""
@@ -169,26 +174,14 @@ class CarObject(DragAndDrop):
         self.rect = pygame.Rect(self.gui_pos[0] - self.width, self.gui_pos[1], self.width, self.height)
 
     def init_sensors(self):
-        """Initializes the sensors of the car"""
+        """Initializes the sensors of the car from the layout, the screen y axis points down"""
         self.sensors.clear()
-        self.sensors.append(
-            self.SensorObject(self.screen, (self.gui_pos[0] - self.height / 220 * 5, self.gui_pos[1]), -math.pi / 4,
-                              self.height * GUIConstants.SENSOR_SIZE, self.height))
-        self.sensors.append(
-            self.SensorObject(self.screen, (self.gui_pos[0], self.gui_pos[1] + self.height / 220 * 40), 0,
-                              self.height * GUIConstants.SENSOR_SIZE, self.height))
-        self.sensors.append(
-            self.SensorObject(self.screen, (self.gui_pos[0], self.gui_pos[1] + self.height / 220 * 80), 0,
-                              self.height * GUIConstants.SENSOR_SIZE, self.height))
-        self.sensors.append(
-            self.SensorObject(self.screen, (self.gui_pos[0], self.gui_pos[1] + self.height / 220 * 140), 0,
-                              self.height * GUIConstants.SENSOR_SIZE, self.height))
-        self.sensors.append(
-            self.SensorObject(self.screen, (self.gui_pos[0], self.gui_pos[1] + self.height / 220 * 180), 0,
-                              self.height * GUIConstants.SENSOR_SIZE, self.height))
-        self.sensors.append(
-            self.SensorObject(self.screen, (self.gui_pos[0] - self.height / 220 * 5, self.gui_pos[1] + self.height),
-                              math.pi / 4, self.height * GUIConstants.SENSOR_SIZE, self.height))
+        for mount in self.layout.mounts:
+            self.sensors.append(
+                self.SensorObject(self.screen, (self.gui_pos[0] + mount.x / GUIConstants.PX_TO_M,
+                                                self.gui_pos[1] - mount.y / GUIConstants.PX_TO_M),
+                                  -mount.heading, self.height * GUIConstants.SENSOR_SIZE,
+                                  mount.max_range / GUIConstants.PX_TO_M, mount.aperture))
 
     def draw(self):
         """Draws the car on the screen"""
@@ -199,7 +192,8 @@ class CarObject(DragAndDrop):
     class SensorObject:
         """Sensor object of the car"""
 
-        def __init__(self, screen, gui_pos, rot, size, car_height):
+        def __init__(self, screen, gui_pos, rot, size, beam_radius, aperture):
+            """The beam shows the view cone: its radius is the range in pixels, aperture is the half opening angle"""
             self.screen = screen
             self.gui_pos = gui_pos
             self.rot = rot
@@ -207,8 +201,8 @@ class CarObject(DragAndDrop):
             self.color = Colors.GREEN
             self.points = []
             self.beam_points = []
-            self.car_height = car_height
-            self.beam_radius = self.car_height / 220 * 300
+            self.beam_radius = beam_radius
+            self.aperture = aperture
             self.calculate_points(gui_pos)
 
         def calculate_points(self, gui_pos):
@@ -226,8 +220,8 @@ class CarObject(DragAndDrop):
             )
             self.beam_points = calculate_rotation(
                 [
-                    (self.beam_radius / 2, -math.sqrt(3) / 2 * self.beam_radius),
-                    (self.beam_radius / 2, math.sqrt(3) / 2 * self.beam_radius)
+                    (math.cos(self.aperture) * self.beam_radius, -math.sin(self.aperture) * self.beam_radius),
+                    (math.cos(self.aperture) * self.beam_radius, math.sin(self.aperture) * self.beam_radius)
                 ],
                 self.rot,
                 self.gui_pos
@@ -248,8 +242,8 @@ class CarObject(DragAndDrop):
                             "yellow",
                             pygame.Rect(self.gui_pos[0] - self.beam_radius, self.gui_pos[1] - self.beam_radius,
                                         2 * self.beam_radius, 2 * self.beam_radius),
-                            -math.pi / 3 - self.rot,
-                            math.pi / 3 - self.rot,
+                            -self.aperture - self.rot,
+                            self.aperture - self.rot,
                             1)
 
             """Sensor 'box'"""
@@ -278,7 +272,6 @@ class CarObject(DragAndDrop):
                     self.color = "orange"
                 elif value <= GUIConstants.OBJECT_DETECTED:
                     self.color = "yellow"
-            self.draw()
 
 
 def calculate_rotation(rel_points, rot, rot_point):
@@ -0,0 +1,143 @@
+import argparse
+import csv
+import sys
+
+import recording
+import scenario
+import simulation
+from control import Control
+from fixed_step import FixedStepLoop
+from profiling import PROFILE_HISTORY, PROFILER
+from sensor_layout import DEFAULT_LAYOUT, load_layout
+
+
+def parse_values(text, count):
+    """Parses a comma separated list of numbers"""
+    values = [float(value) for value in text.split(",")]
+    if len(values) != count:
+        raise argparse.ArgumentTypeError("expected {} comma separated numbers, got '{}'".format(count, text))
+    return values
+
+
+def rectangle_arg(text):
+    """Rectangle obstacle: x,y,width,length,angle (upper left corner, meters, radians)"""
+    x, y, width, length, angle = parse_values(text, 5)
+    return simulation.Rectangle((x, y), width, length, angle)
+
+
+def circle_arg(text):
+    """Circle obstacle: x,y,radius (center, meters)"""
+    x, y, radius = parse_values(text, 3)
+    return simulation.Circle((x, y), radius)
+
+
+def polygon_arg(text):
+    """Convex polygon obstacle: x1,y1,x2,y2,... (corners, meters), two corners are a wall"""
+    values = [float(value) for value in text.split(",")]
+    if len(values) < 4 or len(values) % 2:
+        raise argparse.ArgumentTypeError("expected at least two x,y corners, got '{}'".format(text))
+    return simulation.Polygon(list(zip(values[::2], values[1::2])))
+
+
+def position_arg(text):
+    """Position: x,y (meters)"""
+    return tuple(parse_values(text, 2))
+
+
+def header(sensor_count=len(DEFAULT_LAYOUT)):
+    """Column names of the output"""
+    columns = ["step", "car_x", "car_y", "speed"]
+    for i in range(sensor_count):
+        columns += ["sensor{}_direct".format(i + 1),
+                    "sensor{}_cross_l".format(i + 1),
+                    "sensor{}_cross_r".format(i + 1)]
+    return columns
+
+
+def drive(model, control, steps, step_size, recorder=None):
+    """Steps the model on a fixed step as fast as possible, moving the car by step_size times the speed of the
+    control, yields the row of every step. The steps are also added to the recorder if one is given.
+    Every step is a frame of the profiler."""
+    loop = FixedStepLoop(model, control, step_size, time_step=1.0, recorder=recorder)
+    for step in range(steps):
+        car_pos = model.car_pos
+        loop.step()
+        values = []
+        for sensor in model.sensor_list:
+            values += [sensor.direct_val, sensor.cross_val_l, sensor.cross_val_r]
+        PROFILER.end_frame()
+        yield [step, car_pos[0], car_pos[1], loop.speed] + values
+
+
+def run(model, control, steps, step_size, writer, recorder=None):
+    """Steps the model and writes the sensor values of every step"""
+    writer.writerow(header(len(model.sensor_list)))
+    writer.writerows(drive(model, control, steps, step_size, recorder))
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Runs the ultrasonic sensor simulation without the GUI")
+    parser.add_argument("--car", type=position_arg, default=(0, 3),
+                        help="start position of the upper right corner of the car: x,y [m]")
+    parser.add_argument("--rect", type=rectangle_arg, action="append", default=[],
+                        help="rectangle obstacle: x,y,width,length,angle [m, rad], can be repeated")
+    parser.add_argument("--circle", type=circle_arg, action="append", default=[],
+                        help="circle obstacle: x,y,radius [m], can be repeated")
+    parser.add_argument("--polygon", type=polygon_arg, action="append", default=[],
+                        help="convex polygon obstacle: x1,y1,x2,y2,... corners [m], can be repeated")
+    parser.add_argument("--scenario", help="scenario JSON file or binary library, replaces --car, --rect, --circle "
+                                           "and --polygon, --steps and --step-size default to the scenario")
+    parser.add_argument("--index", type=int, default=0, help="index of the scenario in the file")
+    parser.add_argument("--steps", type=int, help="number of simulation steps (default: 1)")
+    parser.add_argument("--step-size", type=float,
+                        help="distance the car moves along the x axis per step at full speed [m] (default: 0)")
+    parser.add_argument("--output", default="-", help="output CSV file, '-' for the standard output")
+    parser.add_argument("--layout", help="sensor layout JSON file (see sensor_layout.py), default: the 6 front sensors")
+    parser.add_argument("--occlusion", action="store_true",
+                        help="drop the echoes whose path passes through an obstacle")
+    parser.add_argument("--record", help="also write the steps to a binary recording (see recording.py)")
+    parser.add_argument("--record-echoes", action="store_true", help="store the echo geometry in the recording")
+    parser.add_argument("--profile",
+                        help="write the phase times of the last {} steps to a CSV or .json file (see profiling.py)"
+                        .format(PROFILE_HISTORY))
+    parser.add_argument("--cprofile", help="write a cProfile capture of the run to a pstats file")
+    args = parser.parse_args(argv)
+
+    layout = load_layout(args.layout) if args.layout else None
+    if args.scenario:
+        selected = scenario.load_scenario(args.scenario, args.index)
+        model = selected.model(layout)
+        steps = selected.steps if args.steps is None else args.steps
+        step_size = selected.step_size if args.step_size is None else args.step_size
+    else:
+        model = simulation.Model(layout)
+        model.rect_list = args.rect
+        model.circle_list = args.circle
+        model.polygon_list = args.polygon
+        model.car_pos = args.car
+        steps = 1 if args.steps is None else args.steps
+        step_size = 0.0 if args.step_size is None else args.step_size
+    model.occlusion = args.occlusion
+    control = Control()
+    recorder = recording.Recorder(args.record, model.layout, args.record_echoes) if args.record else None
+
+    PROFILER.enabled = bool(args.profile)
+    if args.cprofile:
+        PROFILER.start_cprofile()
+    try:
+        if args.output == "-":
+            run(model, control, steps, step_size, csv.writer(sys.stdout), recorder)
+        else:
+            with open(args.output, "w", newline="") as file:
+                run(model, control, steps, step_size, csv.writer(file), recorder)
+    finally:
+        if recorder is not None:
+            recorder.close()
+        if args.cprofile:
+            PROFILER.stop_cprofile(args.cprofile)
+        if args.profile:
+            PROFILER.export(args.profile)
+
+
+if __name__ == '__main__':
+    main()
@@ -1,9 +1,39 @@
+import argparse
+
 from gui import GUI
+from profiling import PROFILE_HISTORY, PROFILER
+import recording
 
 if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Ultrasonic sensor simulation")
+    parser.add_argument("--record", help="write the drive to a binary recording")
+    parser.add_argument("--record-echoes", action="store_true", help="store the echo geometry in the recording")
+    parser.add_argument("--replay", help="replay a recording instead of running the simulation")
+    parser.add_argument("--profile", help="time the phases of every frame and write those of the last {} frames to a "
+                                          "CSV or .json file at the exit, the overlay (F3) is available without it"
+                                          .format(PROFILE_HISTORY))
+    parser.add_argument("--cprofile", help="write a cProfile capture of the run to a pstats file")
+    args = parser.parse_args()
+
+    recorder = recording.Recorder(args.record, echoes=args.record_echoes) if args.record else None
+    replay = recording.Recording(args.replay) if args.replay else None
+    if args.cprofile:
+        PROFILER.start_cprofile()
     try:
-        gui = GUI()
+        try:
+            gui = GUI(recorder, replay, profile=bool(args.profile))
+        except ValueError as error:
+            parser.error("cannot show the recording: {}".format(error))
         while True:
             gui.update()
     except KeyboardInterrupt:
         print("Script terminated")
+    finally:
+        if recorder is not None:
+            recorder.close()
+        if replay is not None:
+            replay.close()
+        if args.cprofile:
+            PROFILER.stop_cprofile(args.cprofile)
+        if args.profile:
+            PROFILER.export(args.profile)
@@ -0,0 +1,166 @@
+import collections
+import time
+
+""" Timing of the phases of the simulation and the GUI:
+Profiler.phase(name) measures a block, Profiler.count(name) counts calls, Profiler.end_frame() closes a frame
+(one GUI.update or one simulation step) and keeps its phase times and counts.
+Phases may be nested, the time of a phase includes the ones inside it.
+Disabled, phase() returns a shared block that does nothing and count() returns at once.
+"""
+
+""" Number of latest frames kept for the overlay and the export """
+PROFILE_HISTORY = 1800
+""" Number of latest frames averaged by Profiler.averages """
+PROFILE_AVERAGE_FRAMES = 30
+
+
+class Phase:
+    """Block measuring the time of a phase of the profiler"""
+    __slots__ = ("profiler", "name", "start")
+
+    def __init__(self, profiler, name):
+        self.profiler = profiler
+        self.name = name
+        self.start = 0.0
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.profiler.add(self.name, time.perf_counter() - self.start)
+
+
+class NoPhase:
+    """Block of a disabled profiler"""
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        pass
+
+
+NO_PHASE = NoPhase()
+
+
+class Profiler:
+    """Phase times [s] and call counts of the current frame and of the latest frames"""
+
+    def __init__(self, history=PROFILE_HISTORY):
+        self.enabled = False
+        self.times = {}
+        self.counts = {}
+        """ Latest frames: (frame number, end time, phase times, counts) """
+        self.frames = collections.deque(maxlen=history)
+        self.frame_number = 0
+        """ Names in the order they were first seen, for the overlay and the export columns """
+        self.phase_names = {}
+        self.count_names = {}
+        self.cprofile = None
+
+    def phase(self, name):
+        if not self.enabled:
+            return NO_PHASE
+        return Phase(self, name)
+
+    def add(self, name, seconds):
+        self.times[name] = self.times.get(name, 0.0) + seconds
+
+    def count(self, name, calls=1):
+        if self.enabled:
+            self.counts[name] = self.counts.get(name, 0) + calls
+
+    def end_frame(self):
+        """Keeps the phase times and counts of the current frame and starts the next one"""
+        if not self.enabled:
+            return
+        self.phase_names.update(dict.fromkeys(self.times))
+        self.count_names.update(dict.fromkeys(self.counts))
+        self.frames.append((self.frame_number, time.perf_counter(), self.times, self.counts))
+        self.frame_number += 1
+        self.times = {}
+        self.counts = {}
+
+    def reset(self):
+        self.times = {}
+        self.counts = {}
+        self.frames.clear()
+        self.frame_number = 0
+        self.phase_names = {}
+        self.count_names = {}
+
+    def fps(self, frames=PROFILE_AVERAGE_FRAMES):
+        """Frames per second over the latest frames, 0 if there are too few"""
+        recent = list(self.frames)[-frames:]
+        if len(recent) < 2 or recent[-1][1] == recent[0][1]:
+            return 0.0
+        return (len(recent) - 1) / (recent[-1][1] - recent[0][1])
+
+    def averages(self, frames=PROFILE_AVERAGE_FRAMES):
+        """Mean phase times [s] and counts per frame over the latest frames"""
+        recent = list(self.frames)[-frames:]
+        if not recent:
+            return {}, {}
+        times = {name: sum(frame[2].get(name, 0.0) for frame in recent) / len(recent) for name in self.phase_names}
+        counts = {name: sum(frame[3].get(name, 0) for frame in recent) / len(recent) for name in self.count_names}
+        return times, counts
+
+    def rows(self):
+        """The kept frames as rows: frame number, end time [s], phase times [ms], counts"""
+        start = self.frames[0][1] if self.frames else 0.0
+        rows = []
+        for number, end, times, counts in self.frames:
+            row = {"frame": number, "time": end - start}
+            for name in self.phase_names:
+                row[name] = times.get(name, 0.0) * 1000
+            for name in self.count_names:
+                row[name] = counts.get(name, 0)
+            rows.append(row)
+        return rows
+
+    def export_csv(self, path):
+        import csv
+        columns = ["frame", "time"] + list(self.phase_names) + list(self.count_names)
+        with open(path, "w", newline="") as file:
+            writer = csv.DictWriter(file, columns)
+            writer.writeheader()
+            writer.writerows(self.rows())
+
+    def export_json(self, path):
+        import json
+        times, counts = self.averages(len(self.frames))
+        with open(path, "w") as file:
+            json.dump({"phases": list(self.phase_names), "counts": list(self.count_names),
+                       "mean_ms": {name: value * 1000 for name, value in times.items()},
+                       "mean_counts": counts, "frames": self.rows()}, file, indent=1)
+
+    def export(self, path):
+        """Writes the kept frames to a JSON file if the path ends with .json, otherwise to a CSV file"""
+        if path.lower().endswith(".json"):
+            self.export_json(path)
+        else:
+            self.export_csv(path)
+
+    def start_cprofile(self):
+        """Starts a cProfile capture of every function call, it slows the program down"""
+        import cProfile
+        self.cprofile = cProfile.Profile()
+        self.cprofile.enable()
+
+    def stop_cprofile(self, path=None):
+        """Stops the cProfile capture, writes the statistics to the path (pstats format) and returns them"""
+        if self.cprofile is None:
+            return None
+        import pstats
+        self.cprofile.disable()
+        stats = pstats.Stats(self.cprofile)
+        if path:
+            stats.dump_stats(path)
+        self.cprofile = None
+        return stats
+
+
+""" Profiler used by the simulation and the GUI """
+PROFILER = Profiler()
@@ -0,0 +1,352 @@
+import math
+import weakref
+
+import numpy as np
+
+import simulation
+from sensor_layout import CONE_TOLERANCE, DEFAULT_LAYOUT, FORWARD
+from simulation import CROSS_CIRCLE_TOLERANCE
+
+""" Number of bisection steps that reach CROSS_CIRCLE_TOLERANCE on any arc """
+CROSS_CIRCLE_STEPS = int(math.ceil(math.log2(math.pi / CROSS_CIRCLE_TOLERANCE))) + 1
+
+
+""" Columns of a segment of SceneArrays.buffer: start xy, end xy, right side normal xy, min xy and max xy of the
+bounding box, 1 if the direct echo is range checked before rounding (simulation.Polygon.unrounded_check) """
+SEGMENT_COLUMNS = 11
+
+
+class EdgeArrays:
+    """ Sides of the rectangles and polygons (edge_list) facing a direction (simulation.Polygon.sides) as arrays:
+    buffer: (segments, SEGMENT_COLUMNS) the sides in one contiguous array, every obstacle's sides in their order,
+    segments, normals, edge_min, edge_max and unrounded are views of it
+    starts: (obstacles) index of the first segment of every obstacle
+    """
+
+    def __init__(self, edge_list, direction=FORWARD):
+        sides = [obstacle.sides(direction) for obstacle in edge_list]
+        self.buffer = np.array([line[0] + line[1] + normal + bounds + (unrounded,) for obstacle_sides in sides
+                                for line, normal, bounds, unrounded in zip(*obstacle_sides)],
+                               dtype=float).reshape((-1, SEGMENT_COLUMNS))
+        self.segments = self.buffer[:, :4].reshape((-1, 2, 2))
+        self.normals = self.buffer[:, 4:6]
+        self.edge_min = self.buffer[:, 6:8]
+        self.edge_max = self.buffer[:, 8:10]
+        self.unrounded = self.buffer[:, 10] != 0
+        self.starts = np.cumsum([0] + [len(obstacle_sides[0]) for obstacle_sides in sides], dtype=int)[:-1]
+
+
+class SceneArrays:
+    """ Obstacles of a scene compiled into arrays:
+    edges(direction): EdgeArrays of the rectangles and polygons for the sensors facing the direction
+    centers: (circles, xy), radii: (circles)
+    """
+
+    def __init__(self, edge_list, circle_list):
+        self.edge_list = edge_list
+        """ EdgeArrays by facing direction, built on first use """
+        self.edge_arrays = {}
+        self.centers = np.array([circle.center for circle in circle_list], dtype=float).reshape((-1, 2))
+        self.radii = np.array([circle.radius for circle in circle_list], dtype=float)
+
+    def edges(self, direction=FORWARD):
+        arrays = self.edge_arrays.get(direction)
+        if arrays is None:
+            arrays = self.edge_arrays[direction] = EdgeArrays(self.edge_list, direction)
+        return arrays
+
+
+def sensor_positions(car_positions, layout=DEFAULT_LAYOUT):
+    """ Sensor coordinates for an array of car positions: (positions, xy) -> (positions, sensors, xy) """
+    car_positions = np.asarray(car_positions, dtype=float).reshape((-1, 2))
+    offsets = np.array([(mount.x, mount.y) for mount in layout.mounts], dtype=float).reshape((-1, 2))
+    return car_positions[:, None, :] + offsets[None, :, :]
+
+
+class Cones:
+    """ View cones of the sensors of a layout as arrays: directions (sensors, xy), cosines of the half opening angles,
+    ranges, and the headings and bounding angles for the points on the boundary (sensors) """
+
+    def __init__(self, layout):
+        self.directions = np.array([mount.direction for mount in layout.mounts], dtype=float).reshape((-1, 2))
+        self.cos_apertures = np.array([mount.cos_aperture for mount in layout.mounts], dtype=float)
+        self.headings = np.array([mount.heading for mount in layout.mounts], dtype=float)
+        self.min_angles = np.array([mount.min_angle for mount in layout.mounts], dtype=float)
+        self.max_angles = np.array([mount.max_angle for mount in layout.mounts], dtype=float)
+        self.ranges = np.array([mount.max_range for mount in layout.mounts], dtype=float)
+
+    def take(self, indices, shape):
+        """ Cones of the sensors with the given indices (all if None) reshaped to broadcast against points """
+        if indices is None:
+            indices = slice(None)
+        return (self.directions[indices].reshape(shape + (2,)), self.cos_apertures[indices].reshape(shape),
+                self.ranges[indices].reshape(shape), self.headings[indices].reshape(shape),
+                self.min_angles[indices].reshape(shape), self.max_angles[indices].reshape(shape))
+
+
+def range_check(sensors, cones, points):
+    """ Vectorized simulation.range_check (sensor_layout.SensorMount.sees), sensors, cones (of Cones.take) and points
+    are broadcast against each other """
+    directions, cos_apertures, ranges, headings, min_angles, max_angles = cones
+    dx = points[..., 0] - sensors[..., 0]
+    dy = points[..., 1] - sensors[..., 1]
+    d = np.sqrt(dx ** 2 + dy ** 2)
+    inside = dx * directions[..., 0] + dy * directions[..., 1] - d * cos_apertures
+    visible = inside > 0
+    boundary = np.abs(inside) <= CONE_TOLERANCE * d
+    if boundary.any():
+        """ The angle test decides on the boundary, within half a turn of the heading like sensor_layout.wrap_angle """
+        angle = np.arctan2(dy, dx)
+        angle = np.where(angle <= headings - math.pi, angle + 2 * math.pi,
+                         np.where(angle > headings + math.pi, angle - 2 * math.pi, angle))
+        visible = np.where(boundary, (min_angles < angle) & (angle < max_angles), visible)
+    return (d <= ranges) & visible
+
+
+def on_edge(points, edge_min, edge_max):
+    """ Is the point inside the bounding box of the edge, using coordinates rounded to 10 decimals """
+    points = np.round(points, 10)
+    return ((edge_min <= points) & (points <= edge_max)).all(axis=-1)
+
+
+def line_intersection(p1, p2, p3, p4):
+    """ Vectorized simulation.line_intersection of the lines p1-p2 and p3-p4, returns the points and a validity mask """
+    xdiff = (p1[..., 0] - p2[..., 0], p3[..., 0] - p4[..., 0])
+    ydiff = (p1[..., 1] - p2[..., 1], p3[..., 1] - p4[..., 1])
+    div = xdiff[0] * ydiff[1] - xdiff[1] * ydiff[0]
+    valid = div != 0
+    div = np.where(valid, div, 1)
+    d = (p1[..., 0] * p2[..., 1] - p1[..., 1] * p2[..., 0], p3[..., 0] * p4[..., 1] - p3[..., 1] * p4[..., 0])
+    x = (d[0] * xdiff[1] - d[1] * xdiff[0]) / div
+    y = (d[0] * ydiff[1] - d[1] * ydiff[0]) / div
+    return np.stack((x, y), axis=-1), valid
+
+
+def first_valid(points, valid, starts):
+    """ Selects the first valid segment of every obstacle, starts are the first segments of the obstacles:
+    (..., segments, xy), (..., segments) -> (..., obstacles, xy), (..., obstacles)
+    """
+    count = valid.shape[-1]
+    if not len(starts):
+        return points[..., :0, :], valid[..., :0]
+    first = np.minimum.reduceat(np.where(valid, np.arange(count), count), starts, axis=-1)
+    point = np.take_along_axis(points, np.minimum(first, count - 1)[..., None], axis=-2)
+    return point, first < count
+
+
+def direct_echoes(sensors, scene, cones, facing):
+    """ Direct echo points of every sensor on every obstacle, rectangles and polygons first:
+    (positions, sensors, xy) -> (positions, sensors, obstacles, xy), (positions, sensors, obstacles)
+    facing: the sensors of every facing direction, see facing_groups
+    """
+    s = sensors[:, :, None, :]
+
+    """ Segments: projection of the sensor to the sides facing it, along the normal like simulation.edge_solve """
+    edge_points = np.zeros(sensors.shape[:2] + (len(scene.edge_list), 2))
+    edge_valid = np.zeros(sensors.shape[:2] + (len(scene.edge_list),), dtype=bool)
+    for direction, indices, _ in facing:
+        edges = scene.edges(direction)
+        group = s[:, indices]
+        normals = edges.normals[None, None]
+        points, valid = line_intersection(edges.segments[None, None, :, 0], edges.segments[None, None, :, 1], group,
+                                          group + normals * 3)
+        rounded = np.round(points, 10)
+        valid &= (points != 0).any(axis=-1) \
+            & range_check(group, cones.take(indices, (1, -1, 1)), np.where(edges.unrounded[:, None], points, rounded)) \
+            & on_edge(points, edges.edge_min[None, None], edges.edge_max[None, None])
+        edge_points[:, indices], edge_valid[:, indices] = first_valid(rounded, valid, edges.starts)
+
+    """ Circles: closest point of the circle """
+    v = scene.centers[None, None] - s
+    d = np.sqrt((v ** 2).sum(axis=-1))
+    circle_points = s + v * (1 - scene.radii[None, None] / d)[..., None]
+    circle_valid = range_check(s, cones.take(None, (1, -1, 1)), circle_points)
+
+    return np.concatenate((edge_points, circle_points), axis=2), np.concatenate((edge_valid, circle_valid), axis=2)
+
+
+def cross_edge_echoes(s1, s2, first, second, scene, cones, facing):
+    """ Cross-echo points of sensor pairs on the facing sides of the rectangles and polygons,
+    first and second are the indices of the sensors of the pairs, facing the pairs of every facing direction """
+    edge_points = np.zeros(s1.shape[:2] + (len(scene.edge_list), 2))
+    edge_valid = np.zeros(s1.shape[:2] + (len(scene.edge_list),), dtype=bool)
+    for direction, _, pairs in facing:
+        edges = scene.edges(direction)
+        start = edges.segments[None, None, :, 0]
+        normals = edges.normals[None, None]
+        p1 = s1[:, pairs, None, :]
+        p2 = s2[:, pairs, None, :]
+
+        def mirror(point):
+            d = np.abs(((point - start) * normals).sum(axis=-1))
+            return point + normals * 2 * d[..., None]
+
+        points, valid = line_intersection(p1, mirror(p2), p2, mirror(p1))
+        valid &= range_check(p1, cones.take(first[pairs], (1, -1, 1)), points) \
+            & range_check(p2, cones.take(second[pairs], (1, -1, 1)), points) \
+            & on_edge(points, edges.edge_min[None, None], edges.edge_max[None, None])
+        edge_points[:, pairs], edge_valid[:, pairs] = first_valid(np.round(points, 10), valid, edges.starts)
+    return edge_points, edge_valid
+
+
+def cross_circle_echoes(s1, s2, first, second, scene, cones):
+    """ Vectorized simulation.cross_circlesolve on every circle
+    Only the circles that can be in range of both sensors are solved.
+    """
+    shape = s1.shape[:2] + scene.radii.shape
+    c = scene.centers[None, None]
+    r = scene.radii[None, None]
+    d1 = np.sqrt(((c - s1[:, :, None, :]) ** 2).sum(axis=-1))
+    d2 = np.sqrt(((c - s2[:, :, None, :]) ** 2).sum(axis=-1))
+    candidate = (d1 > r) & (d2 > r) & (d1 - r <= cones.ranges[first][None, :, None]) \
+        & (d2 - r <= cones.ranges[second][None, :, None])
+    position, pair, circle = np.nonzero(candidate)
+
+    c = scene.centers[circle]
+    r = scene.radii[circle]
+    s1 = s1[position, pair]
+    s2 = s2[position, pair]
+    fi1 = np.arctan2(c[:, 1] - s1[:, 1], c[:, 0] - s1[:, 0])
+    fi2 = np.arctan2(c[:, 1] - s2[:, 1], c[:, 0] - s2[:, 0])
+    span = (fi2 - fi1 + math.pi) % (2 * math.pi) - math.pi
+
+    def arc_point(fi):
+        return np.stack((c[:, 0] - r * np.cos(fi), c[:, 1] - r * np.sin(fi)), axis=-1)
+
+    def slope(fi):
+        p = arc_point(fi)
+        u = (p - s1) / np.sqrt(((p - s1) ** 2).sum(axis=-1))[:, None] \
+            + (p - s2) / np.sqrt(((p - s2) ** 2).sum(axis=-1))[:, None]
+        return (u[:, 0] * np.sin(fi) - u[:, 1] * np.cos(fi)) * span
+
+    low = np.zeros_like(span)
+    high = np.ones_like(span)
+    grows = slope(fi1) >= 0
+    shrinks = ~grows & (slope(fi1 + span) <= 0)
+    high[grows] = 0.0
+    low[shrinks] = 1.0
+    for _ in range(CROSS_CIRCLE_STEPS):
+        searching = (high - low) * np.abs(span) > CROSS_CIRCLE_TOLERANCE
+        if not searching.any():
+            break
+        mid = (low + high) / 2
+        below = slope(fi1 + mid * span) < 0
+        low = np.where(searching & below, mid, low)
+        high = np.where(searching & ~below, mid, high)
+
+    found = arc_point(fi1 + (low + high) / 2 * span)
+    points = np.zeros(shape + (2,))
+    points[position, pair, circle] = found
+    valid = np.zeros(shape, dtype=bool)
+    valid[position, pair, circle] = range_check(s1, cones.take(first[pair], (-1,)), found) \
+        & range_check(s2, cones.take(second[pair], (-1,)), found)
+    return points, valid
+
+
+def cross_echoes(sensors, scene, cones, first, second, facing):
+    """ Cross-echo points of the sensor pairs (first, second indices) on every obstacle, rectangles and polygons first:
+    (positions, sensors, xy) -> (positions, pairs, obstacles, xy), (positions, pairs, obstacles)
+    """
+    s1 = sensors[:, first]
+    s2 = sensors[:, second]
+    edge_points, edge_valid = cross_edge_echoes(s1, s2, first, second, scene, cones, facing)
+    circle_points, circle_valid = cross_circle_echoes(s1, s2, first, second, scene, cones)
+    return np.concatenate((edge_points, circle_points), axis=2), np.concatenate((edge_valid, circle_valid), axis=2)
+
+
+def pair_indices(layout):
+    """ Indices of the first and of the second sensors of the cross-echo pairs """
+    pairs = np.array(layout.pairs, dtype=int).reshape((-1, 2))
+    return pairs[:, 0], pairs[:, 1]
+
+
+def facing_groups(layout):
+    """ Facing directions of a layout (sensor_layout.SensorLayout.facing) with the indices of their sensors and of
+    their sensor pairs: [(direction, sensor indices, pair indices)], the indices are slices for a single direction """
+    directions = list(dict.fromkeys(layout.facing))
+    if len(directions) == 1:
+        return [(directions[0], slice(None), slice(None))]
+    pair_facing = [layout.facing[first] for first, _ in layout.pairs]
+    return [(direction,
+             np.array([i for i, facing in enumerate(layout.facing) if facing == direction], dtype=int),
+             np.array([i for i, facing in enumerate(pair_facing) if facing == direction], dtype=int))
+            for direction in directions]
+
+
+""" Cones, pair indices and facing groups by layout, dropped with the layout """
+LAYOUT_ARRAYS = weakref.WeakKeyDictionary()
+
+
+def layout_arrays(layout):
+    """ Cones, first and second pair indices and facing groups of a layout, computed once per layout """
+    arrays = LAYOUT_ARRAYS.get(layout)
+    if arrays is None:
+        arrays = LAYOUT_ARRAYS[layout] = (Cones(layout),) + pair_indices(layout) + (facing_groups(layout),)
+    return arrays
+
+
+def sensor_values(sensors, scene, layout=DEFAULT_LAYOUT):
+    """ Sensor values for an array of sensor positions:
+    (positions, sensors, xy) -> (positions, sensors, {direct, left cross, right cross})
+    Like Model.calc_rays, the closest direct echo and the last cross-echo found are used, 0 if there is none.
+    """
+    values = np.zeros(sensors.shape[:2] + (3,))
+    cones, first, second, facing = layout_arrays(layout)
+
+    points, valid = direct_echoes(sensors, scene, cones, facing)
+    if points.shape[2]:
+        d = np.sqrt(((points - sensors[:, :, None, :]) ** 2).sum(axis=-1))
+        d = np.where(valid, d, np.inf).min(axis=-1)
+        values[..., 0] = np.where(np.isfinite(d), d, 0)
+
+    points, valid = cross_echoes(sensors, scene, cones, first, second, facing)
+    if points.shape[2] and len(first):
+        last = valid.shape[-1] - 1 - np.argmax(valid[..., ::-1], axis=-1)
+        point = np.take_along_axis(points, last[..., None, None], axis=2)[:, :, 0]
+        d = (np.sqrt(((point - sensors[:, first]) ** 2).sum(axis=-1))
+             + np.sqrt(((point - sensors[:, second]) ** 2).sum(axis=-1))) / 2
+        d = np.where(valid.any(axis=-1), d, 0)
+        values[:, first, 2] = d
+        values[:, second, 1] = d
+    return values
+
+
+class VectorizedModel(simulation.Model):
+    """ Model computing the echoes of all sensors and obstacles with batched array operations,
+    the occlusion test of the found echoes is the one of simulation.Model """
+
+    def calc_rays(self):
+        scene = SceneArrays(self.rect_list + self.polygon_list, self.circle_list)
+        sensors = sensor_positions(self.car_pos, self.layout)
+        cones, first, second, facing = layout_arrays(self.layout)
+        if self.occlusion:
+            obstacles = self.rect_list + self.polygon_list + self.circle_list
+            self.update_occluders(obstacles, [simulation.echo_key(obstacle) for obstacle in obstacles])
+
+        """ Direct echoes: """
+        self.direct_list = []
+        for sensor in self.sensor_list:
+            sensor.cross_echo_l = []
+            sensor.cross_echo_r = []
+            sensor.direct_echoes = []
+        points, valid = direct_echoes(sensors, scene, cones, facing)
+        for i, j in zip(*np.nonzero(valid[0])):
+            sensor = self.sensor_list[i]
+            direct_point = tuple(points[0, i, j].tolist())
+            if self.occlusion and not self.path_clear((sensor.pos, direct_point)):
+                continue
+            self.direct_list.append([(sensor.x, sensor.y), direct_point])
+            sensor.direct_echoes.append(direct_point)
+
+        """ Cross-echoes: """
+        self.cross_list = []
+        points, valid = cross_echoes(sensors, scene, cones, first, second, facing)
+        for i, j in zip(*np.nonzero(valid[0])):
+            sensor = self.sensor_list[first[i]]
+            other = self.sensor_list[second[i]]
+            cross_point = tuple(points[0, i, j].tolist())
+            if self.occlusion and not self.path_clear((sensor.pos, cross_point, other.pos)):
+                continue
+            self.cross_list.append([(sensor.x, sensor.y), cross_point, (other.x, other.y)])
+            sensor.cross_echo_r = [cross_point[0], cross_point[1], other.x, other.y]
+            other.cross_echo_l = [cross_point[0], cross_point[1], sensor.x, sensor.y]
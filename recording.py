@@ -0,0 +1,378 @@
+import bisect
+import itertools
+import json
+import math
+import mmap
+import os
+import struct
+
+import simulation
+from control import Control
+from sensor_layout import DEFAULT_LAYOUT, SensorLayout
+
+""" Binary recording of drives, the frames are stored in blocks, every block holds its frames column by column:
+header: magic, number of sensors, flags,
+with RECORD_LAYOUT followed by the sensor layout (LAYOUT_HEADER, then the layout as UTF-8 JSON)
+block: BLOCK_HEADER, then one column of doubles for every name of columns(),
+with RECORD_ECHOES also the number of direct and cross echoes of every frame (two columns of uint32)
+followed by the points of the direct echoes (sensor, echo point) and of the cross echoes (sensor, echo point,
+other sensor) of all frames of the block as doubles
+All values are little endian.
+"""
+RECORDING_MAGIC = b"LABREC01"
+RECORDING_HEADER = struct.Struct("<8sII")
+""" number of frames, number of direct echoes, number of cross echoes """
+BLOCK_HEADER = struct.Struct("<III")
+""" Flag of recordings with the echo geometry """
+RECORD_ECHOES = 1
+""" Flag of recordings with the sensor layout, recordings without it were made with DEFAULT_LAYOUT """
+RECORD_LAYOUT = 2
+""" Length of the JSON of the sensor layout """
+LAYOUT_HEADER = struct.Struct("<I")
+""" Number of frames buffered by a Recorder before they are written as one block """
+RECORDING_BLOCK_SIZE = 4096
+""" Coordinates of a direct and of a cross echo """
+DIRECT_ECHO_SIZE = 4
+CROSS_ECHO_SIZE = 6
+
+
+def columns(sensor_count):
+    """Names of the value columns of a recording with the given number of sensors"""
+    names = ["time", "car_x", "car_y", "speed"]
+    for i in range(sensor_count):
+        names += ["sensor{}_direct".format(i + 1),
+                  "sensor{}_cross_l".format(i + 1),
+                  "sensor{}_cross_r".format(i + 1)]
+    return names
+
+
+def doubles(count):
+    return struct.Struct("<{}d".format(count))
+
+
+def counts(count):
+    return struct.Struct("<{}I".format(count))
+
+
+class Frame:
+    """Recorded state of one simulation step: the car position the values were measured at, the speed set by the
+    control (None without control) and the direct, left and right cross-echo value of every sensor"""
+
+    def __init__(self, time, car_pos, speed, values, direct_list=None, cross_list=None):
+        self.time = time
+        self.car_pos = car_pos
+        self.speed = speed
+        self.values = values
+        self.direct_list = direct_list
+        self.cross_list = cross_list
+
+    @classmethod
+    def from_model(cls, time, car_pos, model, speed, echoes=True):
+        """Frame of the current sensor values of a model, with the echo geometry if echoes is True"""
+        values = []
+        for sensor in model.sensor_list:
+            values += [sensor.direct_val, sensor.cross_val_l, sensor.cross_val_r]
+        if echoes:
+            return cls(time, car_pos, speed, values, model.direct_list, model.cross_list)
+        return cls(time, car_pos, speed, values)
+
+    def sensor_values(self, index):
+        """Direct, left and right cross-echo value of a sensor"""
+        return self.values[3 * index:3 * index + 3]
+
+
+class Recorder:
+    """Appends frames to a recording, the frames are buffered and written block by block.
+    An existing recording is continued if append is True, it must have the same sensor layout and echo setting,
+    a block that was not completely written at its end (e.g. after a crash) is cut off first.
+    """
+
+    def __init__(self, path, layout=DEFAULT_LAYOUT, echoes=False, append=False, block_size=RECORDING_BLOCK_SIZE):
+        sensor_count = len(layout)
+        self.sensor_count = sensor_count
+        self.echoes = echoes
+        self.block_size = block_size
+        flags = RECORD_LAYOUT | (RECORD_ECHOES if echoes else 0)
+        layout_json = json.dumps(layout.to_dict()).encode()
+        header = (RECORDING_HEADER.pack(RECORDING_MAGIC, sensor_count, flags)
+                  + LAYOUT_HEADER.pack(len(layout_json)) + layout_json)
+        if append and os.path.exists(path) and os.path.getsize(path) > 0:
+            with open(path, "rb") as file:
+                file_header = file.read(len(header))
+            if file_header != header:
+                raise ValueError("{} is not a recording with the same layout".format(path))
+            with Recording(path) as recording:
+                end = recording.end
+            os.truncate(path, end)
+            self.file = open(path, "ab")
+        else:
+            self.file = open(path, "wb")
+            self.file.write(header)
+        self.columns = [[] for _ in columns(sensor_count)]
+        self.direct_counts = []
+        self.cross_counts = []
+        self.direct_points = []
+        self.cross_points = []
+
+    def record(self, time, car_pos, model, speed):
+        """Adds a frame of the model, car_pos is the position the sensor values were measured at"""
+        self.record_frame(Frame.from_model(time, car_pos, model, speed, self.echoes))
+
+    def record_frame(self, frame):
+        """Adds a frame, a missing speed is stored as NaN"""
+        speed = math.nan if frame.speed is None else frame.speed
+        for column, value in zip(self.columns, [frame.time, frame.car_pos[0], frame.car_pos[1], speed] + frame.values):
+            column.append(value)
+        if self.echoes:
+            self.direct_counts.append(len(frame.direct_list))
+            self.cross_counts.append(len(frame.cross_list))
+            for echo in frame.direct_list:
+                self.direct_points += [coordinate for point in echo for coordinate in point]
+            for echo in frame.cross_list:
+                self.cross_points += [coordinate for point in echo for coordinate in point]
+        if len(self.columns[0]) >= self.block_size:
+            self.flush()
+
+    def flush(self):
+        """Writes the buffered frames as one block"""
+        count = len(self.columns[0])
+        if count == 0:
+            return
+        parts = [BLOCK_HEADER.pack(count, len(self.direct_points) // DIRECT_ECHO_SIZE,
+                                   len(self.cross_points) // CROSS_ECHO_SIZE)]
+        column_struct = doubles(count)
+        parts += [column_struct.pack(*column) for column in self.columns]
+        if self.echoes:
+            parts += [counts(count).pack(*self.direct_counts), counts(count).pack(*self.cross_counts),
+                      doubles(len(self.direct_points)).pack(*self.direct_points),
+                      doubles(len(self.cross_points)).pack(*self.cross_points)]
+        self.file.write(b"".join(parts))
+        self.file.flush()
+        for column in self.columns:
+            column.clear()
+        self.direct_counts.clear()
+        self.cross_counts.clear()
+        self.direct_points.clear()
+        self.cross_points.clear()
+
+    def close(self):
+        self.flush()
+        self.file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+def echo_lists(direct, direct_start, direct_end, cross, cross_start, cross_end):
+    """Direct and cross echo lists (like simulation.Model.direct_list and cross_list) of the flat echo values in the
+    given ranges"""
+    return ([[(direct[i], direct[i + 1]), (direct[i + 2], direct[i + 3])]
+             for i in range(direct_start, direct_end, DIRECT_ECHO_SIZE)],
+            [[(cross[i], cross[i + 1]), (cross[i + 2], cross[i + 3]), (cross[i + 4], cross[i + 5])]
+             for i in range(cross_start, cross_end, CROSS_ECHO_SIZE)])
+
+
+class Block:
+    """Position of a block in a recording"""
+
+    def __init__(self, first, offset, count, direct_count, cross_count):
+        self.first = first
+        self.offset = offset
+        self.count = count
+        self.direct_count = direct_count
+        self.cross_count = cross_count
+        """Where the echoes of every frame start, read on first use, see Recording.echo_index"""
+        self.echo_index = None
+
+
+class Recording:
+    """Memory-mapped recording, any frame or column can be read without decoding the whole file"""
+
+    def __init__(self, path):
+        self.file = open(path, "rb")
+        self.buffer = mmap.mmap(self.file.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, self.sensor_count, flags = RECORDING_HEADER.unpack_from(self.buffer, 0)
+        if magic != RECORDING_MAGIC:
+            self.close()
+            raise ValueError("{} is not a recording".format(path))
+        self.echoes = bool(flags & RECORD_ECHOES)
+        self.columns = columns(self.sensor_count)
+        offset = RECORDING_HEADER.size
+        """Sensor layout the recording was made with, None if it was not stored"""
+        self.layout = None
+        if flags & RECORD_LAYOUT:
+            length, = LAYOUT_HEADER.unpack_from(self.buffer, offset)
+            offset += LAYOUT_HEADER.size
+            self.layout = SensorLayout.from_dict(json.loads(self.buffer[offset:offset + length].decode()))
+            offset += length
+        self.blocks = []
+        self.count = 0
+        while offset + BLOCK_HEADER.size <= len(self.buffer):
+            block = Block(self.count, offset, *BLOCK_HEADER.unpack_from(self.buffer, offset))
+            if offset + self.block_size(block) > len(self.buffer):
+                """The last block was not completely written"""
+                break
+            self.blocks.append(block)
+            self.count += block.count
+            offset += self.block_size(block)
+        """End of the last complete block"""
+        self.end = offset
+        """First frame index and time of every block, to find the block of a frame"""
+        self.block_starts = [block.first for block in self.blocks]
+        self.block_times = [self.block_column(block, 0)[0] for block in self.blocks]
+
+    def block_size(self, block):
+        size = BLOCK_HEADER.size + len(self.columns) * block.count * 8
+        if self.echoes:
+            size += 2 * block.count * 4 + (block.direct_count * DIRECT_ECHO_SIZE
+                                           + block.cross_count * CROSS_ECHO_SIZE) * 8
+        return size
+
+    def __len__(self):
+        return self.count
+
+    def block_column(self, block, index):
+        """Values of a column in a block"""
+        offset = block.offset + BLOCK_HEADER.size + index * block.count * 8
+        return doubles(block.count).unpack_from(self.buffer, offset)
+
+    def column(self, name):
+        """Values of a column of every frame, e.g. column("sensor1_direct")"""
+        index = self.columns.index(name)
+        values = []
+        for block in self.blocks:
+            values += self.block_column(block, index)
+        return values
+
+    def __getitem__(self, index):
+        if index < 0:
+            index += self.count
+        if not 0 <= index < self.count:
+            raise IndexError("frame index out of range")
+        block = self.blocks[bisect.bisect_right(self.block_starts, index) - 1]
+        row = index - block.first
+        offset = block.offset + BLOCK_HEADER.size + row * 8
+        values = [struct.unpack_from("<d", self.buffer, offset + column * block.count * 8)[0]
+                  for column in range(len(self.columns))]
+        direct_list = cross_list = None
+        if self.echoes:
+            direct_list, cross_list = self.echo_lists(block, row)
+        return Frame(values[0], (values[1], values[2]), values[3], values[4:], direct_list, cross_list)
+
+    def echo_index(self, block):
+        """Index of the first direct and cross echo of every frame of the block (and the end of the last one), and the
+        positions of the direct and cross echo arrays, the echo counts are read once per block"""
+        if block.echo_index is None:
+            offset = block.offset + BLOCK_HEADER.size + len(self.columns) * block.count * 8
+            direct_counts = counts(block.count).unpack_from(self.buffer, offset)
+            cross_counts = counts(block.count).unpack_from(self.buffer, offset + block.count * 4)
+            direct_offset = offset + 2 * block.count * 4
+            block.echo_index = (list(itertools.accumulate(direct_counts, initial=0)),
+                                list(itertools.accumulate(cross_counts, initial=0)),
+                                direct_offset, direct_offset + block.direct_count * DIRECT_ECHO_SIZE * 8)
+        return block.echo_index
+
+    def echo_lists(self, block, row):
+        """Direct and cross echo geometry of a frame of the block"""
+        direct_starts, cross_starts, direct_offset, cross_offset = self.echo_index(block)
+        direct = doubles((direct_starts[row + 1] - direct_starts[row]) * DIRECT_ECHO_SIZE).unpack_from(
+            self.buffer, direct_offset + direct_starts[row] * DIRECT_ECHO_SIZE * 8)
+        cross = doubles((cross_starts[row + 1] - cross_starts[row]) * CROSS_ECHO_SIZE).unpack_from(
+            self.buffer, cross_offset + cross_starts[row] * CROSS_ECHO_SIZE * 8)
+        return echo_lists(direct, 0, len(direct), cross, 0, len(cross))
+
+    def __iter__(self):
+        """Frames in order, decoded block by block"""
+        for block in self.blocks:
+            block_columns = [self.block_column(block, index) for index in range(len(self.columns))]
+            if self.echoes:
+                """The echoes of the whole block are read at once"""
+                direct_starts, cross_starts, direct_offset, cross_offset = self.echo_index(block)
+                direct = doubles(block.direct_count * DIRECT_ECHO_SIZE).unpack_from(self.buffer, direct_offset)
+                cross = doubles(block.cross_count * CROSS_ECHO_SIZE).unpack_from(self.buffer, cross_offset)
+            for row, values in enumerate(zip(*block_columns)):
+                direct_list = cross_list = None
+                if self.echoes:
+                    direct_list, cross_list = echo_lists(
+                        direct, direct_starts[row] * DIRECT_ECHO_SIZE, direct_starts[row + 1] * DIRECT_ECHO_SIZE,
+                        cross, cross_starts[row] * CROSS_ECHO_SIZE, cross_starts[row + 1] * CROSS_ECHO_SIZE)
+                yield Frame(values[0], (values[1], values[2]), values[3], list(values[4:]), direct_list, cross_list)
+
+    def index_at(self, time):
+        """Index of the last frame recorded at or before the time, 0 before the first frame"""
+        if not self.blocks:
+            raise IndexError("empty recording")
+        block = self.blocks[max(bisect.bisect_right(self.block_times, time) - 1, 0)]
+        return block.first + max(bisect.bisect_right(self.block_column(block, 0), time) - 1, 0)
+
+    def close(self):
+        self.buffer.close()
+        self.file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+class ReplayModel(simulation.Model):
+    """Model that shows the frames of a recording instead of solving the echoes,
+    step() loads the frame of the current replay time"""
+
+    def __init__(self, recording):
+        layout = recording.layout
+        if layout is None:
+            if recording.sensor_count != len(DEFAULT_LAYOUT):
+                raise ValueError("the recording has {} sensors but no sensor layout".format(recording.sensor_count))
+            layout = DEFAULT_LAYOUT
+        super().__init__(layout)
+        self.recording = recording
+        self.frame = None
+        self.rewind()
+
+    def advance(self, elapsed):
+        """Moves the replay time forward by the elapsed time [s]"""
+        self.time += elapsed
+
+    def seek(self, time):
+        self.time = time
+
+    def rewind(self):
+        """Goes back to the first frame"""
+        if len(self.recording) == 0:
+            raise ValueError("empty recording")
+        self.time = self.recording[0].time
+
+    def step(self):
+        frame = self.recording[self.recording.index_at(self.time)]
+        self.frame = frame
+        self.car_pos = frame.car_pos
+        for sensor in self.sensor_list:
+            sensor.direct_val, sensor.cross_val_l, sensor.cross_val_r = frame.sensor_values(sensor.index)
+        self.direct_list = frame.direct_list or []
+        self.cross_list = frame.cross_list or []
+
+
+def control_input(frame, sensor_count):
+    """Input of the control in the order of FixedStepLoop: direct, right and left cross echo of every sensor"""
+    values = []
+    for index in range(sensor_count):
+        direct, cross_l, cross_r = frame.sensor_values(index)
+        values += [direct, cross_r, cross_l]
+    return values
+
+
+def replay_control(recording, control=None):
+    """Feeds the recorded sensor values to the control, returns the indices of the frames where its output differs
+    from the recorded speed"""
+    control = control or Control()
+    mismatches = []
+    for index, frame in enumerate(recording):
+        control.input = control_input(frame, recording.sensor_count)
+        if control.get_speed() != frame.speed:
+            mismatches.append(index)
+    return mismatches
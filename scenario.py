@@ -0,0 +1,219 @@
+import json
+import mmap
+import os
+import struct
+
+import simulation
+
+""" Binary scenario library:
+header: magic, number of scenarios, position of the offset table
+records: one per scenario, see RECORD_HEADER, RECTANGLE_RECORD, CIRCLE_RECORD and POLYGON_RECORD
+offset table: file position of every record, so any scenario can be read without parsing the others
+All values are little endian. Libraries of the first version (without polygons) can still be read.
+"""
+LIBRARY_MAGIC = b"LABSCN02"
+LIBRARY_MAGIC_V1 = b"LABSCN01"
+LIBRARY_HEADER = struct.Struct("<8sQQ")
+OFFSET = struct.Struct("<Q")
+""" car x, car y, steps, step size, number of rectangles, number of circles, number of polygons """
+RECORD_HEADER = struct.Struct("<ddIdIII")
+""" Record header of the first version: car x, car y, steps, step size, number of rectangles, number of circles """
+RECORD_HEADER_V1 = struct.Struct("<ddIdII")
+""" x, y, width, length, angle """
+RECTANGLE_RECORD = struct.Struct("<5d")
+""" x, y, radius """
+CIRCLE_RECORD = struct.Struct("<3d")
+""" Number of corners, followed by a CORNER_RECORD for every corner """
+POLYGON_RECORD = struct.Struct("<I")
+""" x, y """
+CORNER_RECORD = struct.Struct("<2d")
+
+
+class Scenario:
+    """Obstacle layout and car start position of a simulation run:
+    rectangles: (x, y, width, length, angle) tuples, upper left corner
+    circles: (x, y, radius) tuples, center
+    polygons: lists of (x, y) corners of convex polygons
+    """
+
+    def __init__(self, rectangles, circles, car_pos, steps=1, step_size=0.0, polygons=()):
+        self.rectangles = [tuple(rectangle) for rectangle in rectangles]
+        self.circles = [tuple(circle) for circle in circles]
+        self.polygons = [[tuple(corner) for corner in polygon] for polygon in polygons]
+        self.car_pos = tuple(car_pos)
+        self.steps = steps
+        self.step_size = step_size
+
+    def __eq__(self, other):
+        return isinstance(other, Scenario) and self.to_dict() == other.to_dict()
+
+    """ A scenario can be changed, so it is not hashable """
+    __hash__ = None
+
+    def model(self, layout=None):
+        """Simulation model of the scenario with the given sensor_layout.SensorLayout (default: DEFAULT_LAYOUT)"""
+        model = simulation.Model(layout)
+        model.rect_list = [simulation.Rectangle((x, y), width, length, angle)
+                           for x, y, width, length, angle in self.rectangles]
+        model.circle_list = [simulation.Circle((x, y), radius) for x, y, radius in self.circles]
+        model.polygon_list = [simulation.Polygon(polygon) for polygon in self.polygons]
+        model.car_pos = self.car_pos
+        return model
+
+    @classmethod
+    def from_model(cls, model, steps=1, step_size=0.0):
+        """Scenario of the current obstacles and car position of a model"""
+        return cls([(rect.corner_A[0], rect.corner_A[1], rect.width, rect.length, rect.angle)
+                    for rect in model.rect_list],
+                   [(circle.center[0], circle.center[1], circle.radius) for circle in model.circle_list],
+                   model.car_pos, steps, step_size, [polygon.corners for polygon in model.polygon_list])
+
+    def to_dict(self):
+        """Human-readable representation"""
+        return {
+            "car": list(self.car_pos),
+            "steps": self.steps,
+            "step_size": self.step_size,
+            "rectangles": [dict(zip(("x", "y", "width", "length", "angle"), rectangle))
+                           for rectangle in self.rectangles],
+            "circles": [dict(zip(("x", "y", "radius"), circle)) for circle in self.circles],
+            "polygons": [[list(corner) for corner in polygon] for polygon in self.polygons],
+        }
+
+    @classmethod
+    def from_dict(cls, data):
+        return cls([(rectangle["x"], rectangle["y"], rectangle["width"], rectangle["length"], rectangle["angle"])
+                    for rectangle in data.get("rectangles", [])],
+                   [(circle["x"], circle["y"], circle["radius"]) for circle in data.get("circles", [])],
+                   data["car"], data.get("steps", 1), data.get("step_size", 0.0), data.get("polygons", []))
+
+    def pack(self):
+        """Binary record of the scenario"""
+        parts = [RECORD_HEADER.pack(self.car_pos[0], self.car_pos[1], self.steps, self.step_size,
+                                    len(self.rectangles), len(self.circles), len(self.polygons))]
+        parts += [RECTANGLE_RECORD.pack(*rectangle) for rectangle in self.rectangles]
+        parts += [CIRCLE_RECORD.pack(*circle) for circle in self.circles]
+        for polygon in self.polygons:
+            parts.append(POLYGON_RECORD.pack(len(polygon)))
+            parts += [CORNER_RECORD.pack(*corner) for corner in polygon]
+        return b"".join(parts)
+
+    @classmethod
+    def unpack_from(cls, buffer, offset=0, version=2):
+        """Scenario from the binary record of the library version at the given offset of the buffer"""
+        if version == 1:
+            car_x, car_y, steps, step_size, rect_count, circle_count = RECORD_HEADER_V1.unpack_from(buffer, offset)
+            polygon_count = 0
+            offset += RECORD_HEADER_V1.size
+        else:
+            car_x, car_y, steps, step_size, rect_count, circle_count, polygon_count = \
+                RECORD_HEADER.unpack_from(buffer, offset)
+            offset += RECORD_HEADER.size
+        rectangles = list(RECTANGLE_RECORD.iter_unpack(buffer[offset:offset + rect_count * RECTANGLE_RECORD.size]))
+        offset += rect_count * RECTANGLE_RECORD.size
+        circles = list(CIRCLE_RECORD.iter_unpack(buffer[offset:offset + circle_count * CIRCLE_RECORD.size]))
+        offset += circle_count * CIRCLE_RECORD.size
+        polygons = []
+        for _ in range(polygon_count):
+            corner_count, = POLYGON_RECORD.unpack_from(buffer, offset)
+            offset += POLYGON_RECORD.size
+            polygons.append(list(CORNER_RECORD.iter_unpack(buffer[offset:offset + corner_count * CORNER_RECORD.size])))
+            offset += corner_count * CORNER_RECORD.size
+        return cls(rectangles, circles, (car_x, car_y), steps, step_size, polygons)
+
+
+def save_json(path, scenarios):
+    """Writes one scenario or a list of scenarios to a human-readable JSON file"""
+    if isinstance(scenarios, Scenario):
+        data = scenarios.to_dict()
+    else:
+        data = [scenario.to_dict() for scenario in scenarios]
+    with open(path, "w") as file:
+        json.dump(data, file, indent=2)
+
+
+def load_json(path):
+    """Reads the scenarios of a JSON file written by save_json, always returns a list"""
+    with open(path) as file:
+        data = json.load(file)
+    if isinstance(data, dict):
+        data = [data]
+    return [Scenario.from_dict(item) for item in data]
+
+
+def write_library(path, scenarios):
+    """Writes the scenarios to a binary library, the scenarios can be a generator"""
+    offsets = []
+    with open(path, "wb") as file:
+        file.write(LIBRARY_HEADER.pack(LIBRARY_MAGIC, 0, 0))
+        for scenario in scenarios:
+            offsets.append(file.tell())
+            file.write(scenario.pack())
+        table_pos = file.tell()
+        file.write(b"".join(OFFSET.pack(offset) for offset in offsets))
+        file.seek(0)
+        file.write(LIBRARY_HEADER.pack(LIBRARY_MAGIC, len(offsets), table_pos))
+    return len(offsets)
+
+
+class ScenarioLibrary:
+    """Memory-mapped binary scenario library, any scenario can be read without parsing the whole file"""
+
+    def __init__(self, path):
+        self.file = open(path, "rb")
+        size = os.fstat(self.file.fileno()).st_size
+        if size < LIBRARY_HEADER.size:
+            """ mmap cannot map an empty file """
+            self.file.close()
+            raise ValueError("{} is not a scenario library".format(path))
+        self.buffer = mmap.mmap(self.file.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, self.count, self.table_pos = LIBRARY_HEADER.unpack_from(self.buffer, 0)
+        if magic not in (LIBRARY_MAGIC, LIBRARY_MAGIC_V1):
+            self.close()
+            raise ValueError("{} is not a scenario library".format(path))
+        if self.table_pos + self.count * OFFSET.size > size:
+            self.close()
+            raise ValueError("{} is a truncated scenario library".format(path))
+        self.version = 1 if magic == LIBRARY_MAGIC_V1 else 2
+
+    def __len__(self):
+        return self.count
+
+    def __getitem__(self, index):
+        if index < 0:
+            index += self.count
+        if not 0 <= index < self.count:
+            raise IndexError("scenario index out of range")
+        offset, = OFFSET.unpack_from(self.buffer, self.table_pos + index * OFFSET.size)
+        try:
+            return Scenario.unpack_from(self.buffer, offset, self.version)
+        except struct.error:
+            raise ValueError("scenario {} of the library is truncated".format(index)) from None
+
+    def __iter__(self):
+        for index in range(self.count):
+            yield self[index]
+
+    def close(self):
+        self.buffer.close()
+        self.file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+def is_library(path):
+    """Is the file a binary scenario library"""
+    with open(path, "rb") as file:
+        return file.read(len(LIBRARY_MAGIC)) in (LIBRARY_MAGIC, LIBRARY_MAGIC_V1)
+
+
+def load_scenario(path, index=0):
+    """Reads one scenario of a JSON file or a binary library"""
+    if is_library(path):
+        with ScenarioLibrary(path) as library:
+            return library[index]
+    return load_json(path)[index]
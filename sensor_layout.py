@@ -0,0 +1,154 @@
+import math
+
+from sim_constants import SensorLocations
+
+
+""" Facing direction of the sensors of the default layout, the one the obstacles precompute their facing sides for """
+FORWARD = (1.0, 0.0)
+
+
+""" Margin of the dot product test relative to the distance, points closer to the cone boundary are decided by the
+angle test of the original range_check, so the ties on the boundary (e.g. at exactly 60 degrees) come out the same """
+CONE_TOLERANCE = 1e-9
+
+
+def cone_extent(heading, max_range, aperture):
+    """ Bounding box (min_x, min_y, max_x, max_y) of a view cone relative to the sensor """
+    min_angle, max_angle = heading - aperture, heading + aperture
+    angles = [min_angle, max_angle] + [k * math.pi / 2 for k in range(math.floor(min_angle / (math.pi / 2)),
+                                                                      math.ceil(max_angle / (math.pi / 2)) + 1)
+                                       if min_angle < k * math.pi / 2 < max_angle]
+    points = [(0, 0)] + [(max_range * math.cos(angle), max_range * math.sin(angle)) for angle in angles]
+    xs = [point[0] for point in points]
+    ys = [point[1] for point in points]
+    return min(xs), min(ys), max(xs), max(ys)
+
+
+def wrap_angle(angle, heading):
+    """ The angle [rad] moved by a full turn into (heading - pi, heading + pi], angles already in it are unchanged """
+    if angle <= heading - math.pi:
+        return angle + 2 * math.pi
+    if angle > heading + math.pi:
+        return angle - 2 * math.pi
+    return angle
+
+
+class SensorMount:
+    """ Mounting pose and field of view of a sensor:
+    position relative to the upper right corner of the car [m], heading [rad], range [m] and half opening angle [rad].
+    The view cone is stored as a unit direction and the cosine of the half opening angle,
+    so a point is visible if its distance is at most the range and its dot product with the direction is larger than
+    the distance times the cosine. Within CONE_TOLERANCE of the boundary the direction has to be strictly between the
+    bounding angles, taken within half a turn of the heading.
+    """
+    __slots__ = ("x", "y", "heading", "max_range", "aperture", "group",
+                 "direction", "cos_aperture", "min_angle", "max_angle", "extent")
+
+    def __init__(self, x, y, heading=0.0, max_range=SensorLocations.range, aperture=SensorLocations.aperture,
+                 group=0):
+        self.x = x
+        self.y = y
+        self.heading = heading
+        self.max_range = max_range
+        self.aperture = aperture
+        self.group = group
+        self.direction = (math.cos(heading), math.sin(heading))
+        self.cos_aperture = math.cos(min(aperture, math.pi))
+        self.min_angle = heading - aperture
+        self.max_angle = heading + aperture
+        self.extent = cone_extent(heading, max_range, aperture)
+
+    def sees(self, dx, dy):
+        """ Is the point at (dx, dy) from the sensor in range and inside the view cone """
+        d = math.sqrt(dx ** 2 + dy ** 2)
+        if d > self.max_range:
+            return False
+        inside = dx * self.direction[0] + dy * self.direction[1] - d * self.cos_aperture
+        if abs(inside) > CONE_TOLERANCE * d:
+            return inside > 0
+        """ On the boundary or at the sensor itself """
+        return self.min_angle < wrap_angle(math.atan2(dy, dx), self.heading) < self.max_angle
+
+    def to_dict(self):
+        return {"x": self.x, "y": self.y, "heading": self.heading, "range": self.max_range,
+                "aperture": self.aperture, "group": self.group}
+
+    @classmethod
+    def from_dict(cls, data, defaults=None):
+        """ Mount from a dict, the missing range, aperture and heading are taken from the defaults """
+        defaults = defaults or {}
+        return cls(data["x"], data["y"], data.get("heading", defaults.get("heading", 0.0)),
+                   data.get("range", defaults.get("range", SensorLocations.range)),
+                   data.get("aperture", defaults.get("aperture", SensorLocations.aperture)),
+                   data.get("group", 0))
+
+
+def facing_direction(mounts):
+    """ Unit vector the sensors of a group look along, the mean of their heading directions. The sides of an obstacle
+    that face it are the ones solved for the group (see simulation.facing_sides). """
+    x = sum(mount.direction[0] for mount in mounts)
+    y = sum(mount.direction[1] for mount in mounts)
+    length = math.sqrt(x ** 2 + y ** 2)
+    if length == 0:
+        return mounts[0].direction
+    direction = (x / length, y / length)
+    """ The solvers take the precomputed sides of the obstacles for FORWARD itself """
+    return FORWARD if direction == FORWARD else direction
+
+
+class SensorLayout:
+    """ Sensors of the car in order, e.g. from one side of the bumper to the other.
+    The cross-echoes are measured by every pair of neighbouring sensors of the same group,
+    e.g. the front and the rear bumper are two groups.
+    facing: facing direction of the group of every sensor
+    """
+
+    def __init__(self, mounts):
+        self.mounts = list(mounts)
+        self.pairs = [(i, i + 1) for i in range(len(self.mounts) - 1)
+                      if self.mounts[i].group == self.mounts[i + 1].group]
+        directions = {group: facing_direction([mount for mount in self.mounts if mount.group == group])
+                      for group in dict.fromkeys(mount.group for mount in self.mounts)}
+        self.facing = [directions[mount.group] for mount in self.mounts]
+
+    def __len__(self):
+        return len(self.mounts)
+
+    def to_dict(self):
+        return {"sensors": [mount.to_dict() for mount in self.mounts]}
+
+    @classmethod
+    def from_dict(cls, data):
+        """ Layout of a configuration: {"range": .., "aperture": .., "sensors": [{"x": .., "y": .., "heading": ..,
+        "range": .., "aperture": .., "group": ..}, ..]}, the range and aperture of the sensors default to the common
+        values, angles are in degrees if "degrees" is true """
+        scale = math.pi / 180 if data.get("degrees") else 1
+        defaults = {key: data[key] for key in ("range", "aperture") if key in data}
+        if "aperture" in defaults:
+            defaults["aperture"] *= scale
+        mounts = []
+        for sensor in data["sensors"]:
+            sensor = dict(sensor)
+            for key in ("heading", "aperture"):
+                if key in sensor:
+                    sensor[key] *= scale
+            mounts.append(SensorMount.from_dict(sensor, defaults))
+        return cls(mounts)
+
+
+def load_layout(path):
+    """ Reads a sensor layout from a JSON file """
+    import json
+    with open(path) as file:
+        return SensorLayout.from_dict(json.load(file))
+
+
+def save_layout(path, layout):
+    import json
+    with open(path, "w") as file:
+        json.dump(layout.to_dict(), file, indent=2)
+
+
+""" The 6 sensors of the front bumper """
+DEFAULT_LAYOUT = SensorLayout([SensorMount(location[0], location[1], heading)
+                               for location, heading in zip(SensorLocations.list, SensorLocations.headings)])
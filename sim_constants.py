@@ -1,3 +1,6 @@
+import math
+
+
 class SensorLocations:
     """
     Sensor location coordinates in the local x-y system of the car,
@@ -9,3 +12,8 @@ class SensorLocations:
             [0, -1.40],
             [0, -1.80],
             [-0.05, -2.20]]
+    """ Direction the sensors look at [rad], the corner sensors are turned outwards """
+    headings = [math.pi / 4, 0, 0, 0, 0, -math.pi / 4]
+    """ Range [m] and half opening angle [rad] of the sensors """
+    range = 3
+    aperture = math.pi / 3
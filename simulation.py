@@ -1,10 +1,89 @@
-from gui import *
-from sim_constants import SensorLocations
 import math
 
+from profiling import PROFILER
+from sensor_layout import DEFAULT_LAYOUT, FORWARD
+from spatial_index import GridIndex, box_intersection
 
-class Rectangle:
-    """ Upper left corner: pos_tuple (x,y) """
+
+""" Tolerance of the component of a unit side normal along the facing direction, a side within it is parallel to the
+direction """
+FACING_TOLERANCE = 1e-12
+
+
+def facing_sides(corners, direction=FORWARD):
+    """ Sides of a convex polygon (clockwise corners) that face sensors looking along the direction (a unit vector):
+    the ones whose inward normal points along it. A side parallel to it faces if its inward normal points to the left
+    of the direction for sensors looking forwards (x >= 0) and to the right for the ones looking backwards, i.e. up for
+    both the front and the rear bumper, so a layout mirrored from the front to the rear takes the mirrored sides.
+    Returns the sides in counter-clockwise order, oriented so that their right side normals point inwards,
+    and their normals
+    """
+    ux, uy = direction
+    """ Side normal that breaks the ties """
+    tx, ty = (-uy, ux) if ux >= 0 else (uy, -ux)
+    sides = []
+    for i in range(len(corners)):
+        p, q = corners[i - 1], corners[i]
+        if p != q:
+            normal = normal_vect(p[0], p[1], q[0], q[1])
+            along = normal[0] * ux + normal[1] * uy
+            along = 0 if abs(along) <= FACING_TOLERANCE else along
+            sides.append(((p, q), normal, along > 0 or (along == 0 and normal[0] * tx + normal[1] * ty > 0)))
+    """ The facing sides are a chain, it is listed from the side before a side that does not face """
+    start = next((i for i, side in enumerate(sides) if not side[2]), 0)
+    ordered = [sides[(start - k) % len(sides)] for k in range(1, len(sides) + 1)]
+    return tuple(side[0] for side in ordered if side[2]), tuple(side[1] for side in ordered if side[2])
+
+
+def edge_bounds(edges):
+    """ Bounding boxes of the sides with the endpoints rounded to 10 decimals """
+    return tuple(bounding_box([(round(p[0], 10), round(p[1], 10)), (round(q[0], 10), round(q[1], 10))])
+                 for p, q in edges)
+
+
+class Polygon:
+    """ Convex polygon obstacle, e.g. a curb, a wall or a pillar: corners [(x1, y1), (x2, y2), ...] in any direction
+    The geometry used by the solvers is computed once here, a moved polygon is a new Polygon object.
+    The facing sides are the ones of the default sensors (sensor_layout.FORWARD), sides() gives them for any direction.
+    """
+    __slots__ = ("corners", "facing_edges", "facing_normals", "edge_bounds", "unrounded_check", "box", "key",
+                 "facing")
+
+    def __init__(self, corners):
+        corners = [tuple(corner) for corner in corners]
+        if sum(p[0] * q[1] - q[0] * p[1] for p, q in zip(corners, corners[1:] + corners[:1])) > 0:
+            """ Counter-clockwise """
+            corners.reverse()
+        self.corners = tuple(corners)
+        self.facing_edges, self.facing_normals = facing_sides(corners)
+        if not self.facing_edges:
+            raise ValueError("a polygon needs at least two different corners")
+        self.edge_bounds = edge_bounds(self.facing_edges)
+        """ Sides whose direct echo is range checked before it is rounded, see Rectangle """
+        self.unrounded_check = (False,) * len(self.facing_edges)
+        self.box = bounding_box(corners)
+        """ Pose of the polygon, the echoes are cached by it and the object (echo_key) """
+        self.key = ("polygon", self.corners)
+        """ Facing sides of the other directions by direction, see sides() """
+        self.facing = {}
+
+    def sides(self, direction):
+        """ Facing sides, their normals, bounding boxes and unrounded_check flags for sensors looking along the
+        direction (sensor_layout.SensorLayout.facing), computed once per direction """
+        if direction == FORWARD:
+            return self.facing_edges, self.facing_normals, self.edge_bounds, self.unrounded_check
+        sides = self.facing.get(direction)
+        if sides is None:
+            edges, normals = facing_sides(self.corners, direction)
+            sides = self.facing[direction] = (edges, normals, edge_bounds(edges), (False,) * len(edges))
+        return sides
+
+
+class Rectangle(Polygon):
+    """ Upper left corner: pos_tuple (x,y)
+    The geometry used by the solvers is computed once here, a moved rectangle is a new Rectangle object.
+    """
+    __slots__ = ("width", "length", "angle", "corner_A", "corner_B", "corner_C", "corner_D")
 
     def __init__(self, pos_tuple, width, length, angle):
         self.width = width
@@ -15,21 +94,40 @@ class Rectangle:
         self.corner_D = (pos_tuple[0] - width * math.sin(angle), pos_tuple[1] - width * math.cos(angle))
         self.corner_C = (self.corner_D[0] + length * math.cos(angle), self.corner_D[1] - length * math.sin(angle))
 
+        """ The corners are clockwise, two sides face the sensors """
+        super().__init__((self.corner_A, self.corner_B, self.corner_C, self.corner_D))
+        """ The original solver range checked the direct echo on DA of a rectangle turned by less than a quarter turn
+        before rounding it, on the cone boundary (e.g. at 60 degrees) the order decides """
+        if 0 <= angle < math.pi / 2:
+            self.unrounded_check = tuple(side == (self.corner_D, self.corner_A) for side in self.facing_edges)
+        """ Pose of the rectangle, the echoes are cached by it and the object (echo_key) """
+        self.key = ("rectangle", pos_tuple, width, length, angle)
+
 
 class Circle:
+    """ The geometry used by the solvers is computed once here, a moved circle is a new Circle object """
+    __slots__ = ("center", "radius", "box", "key")
+
     def __init__(self, pos_tuple, radius):
         self.center = pos_tuple
         self.radius = radius
+        self.box = (pos_tuple[0] - radius, pos_tuple[1] - radius, pos_tuple[0] + radius, pos_tuple[1] + radius)
+        """ Pose of the circle, the echoes are cached by it and the object (echo_key) """
+        self.key = ("circle", pos_tuple, radius)
 
 
 class Sensor:
-    def __init__(self, car_pos, index):
+    def __init__(self, car_pos, index, mount=None, facing=FORWARD):
+        """ The mount (sensor_layout.SensorMount) defaults to the sensor of the default layout with the index,
+        the obstacle sides facing the direction of its group (sensor_layout.SensorLayout.facing) are solved """
         self.index = index
+        self.mount = mount or DEFAULT_LAYOUT.mounts[index]
+        self.facing = facing
         self.direct_val = 0
         self.cross_val_l = 0
         self.cross_val_r = 0
-        self.x = car_pos[0] + SensorLocations.list[index][0]
-        self.y = car_pos[1] + SensorLocations.list[index][1]
+        self.x = car_pos[0] + self.mount.x
+        self.y = car_pos[1] + self.mount.y
         self.pos = (self.x, self.y)
         """ 
         Direct echoes: list of tuples [(x1,y1), (x2, y2)]
@@ -40,8 +138,8 @@ class Sensor:
         self.cross_echo_r = []
 
     def update_loc(self, car_pos):
-        self.x = car_pos[0] + SensorLocations.list[self.index][0]
-        self.y = car_pos[1] + SensorLocations.list[self.index][1]
+        self.x = car_pos[0] + self.mount.x
+        self.y = car_pos[1] + self.mount.y
         self.pos = (self.x, self.y)
 
     def min_direct(self):
@@ -74,28 +172,100 @@ class Sensor:
             self.cross_val_r = 0
 
 
+""" Number of car positions times obstacles evaluated at once by Model.step_many """
+STEP_MANY_CHUNK = 1 << 16
+""" Depth [m] an echo path has to reach into an obstacle to be blocked by it,
+the echo point itself lies on the outline of its obstacle """
+OCCLUSION_TOLERANCE = 1e-9
+
+
+def echo_key(obstacle):
+    """ Key of the echoes of an obstacle in the echo cache: the object and its pose, so equal obstacles at the same pose
+    keep an echo each and a moved obstacle is solved again """
+    return id(obstacle), obstacle.key
+
+
 class Model:
-    """Initialize model for simulation """
+    """Initialize model for simulation, with the sensors of the given sensor_layout.SensorLayout
+    With occlusion, an echo is only kept if its path does not pass through any obstacle, including its own one
+    """
 
-    def __init__(self):
+    def __init__(self, layout=None, occlusion=False):
         """ Inputs """
         self.rect_list = []
+        self.polygon_list = []
         self.circle_list = []
         self.car_pos = (0, 0)
         """ Outputs """
         self.direct_list = []  # [(x1, y1),(x2, y2)] [(), ()] ...
         self.cross_list = []  # [(x1, y1),(x2, y2), (x3, y3)] [(), (), ()] ...
+        self.layout = layout or DEFAULT_LAYOUT
         self.sensor_list = []
-        for i in range(6):
-            self.sensor_list.append((Sensor(self.car_pos, i)))
+        for i, mount in enumerate(self.layout.mounts):
+            self.sensor_list.append((Sensor(self.car_pos, i, mount, self.layout.facing[i])))
         self.move = False
+        """ Spatial index of the obstacles: the ones with sides (rectangles and polygons) and the circles """
+        self.edge_index = GridIndex()
+        self.circle_index = GridIndex()
+        """ Echo cache: found echo points by echo_key for every sensor and adjacent sensor pair """
+        self.solved_car_pos = None
+        self.solved_keys = []
+        self.direct_found = [{} for _ in self.sensor_list]
+        self.cross_found = [{} for _ in self.layout.pairs]
+        """ Occlusion test: spatial index of all obstacles, rebuilt when they change """
+        self.occlusion = occlusion
+        self.occluder_index = GridIndex()
+        self.occluder_keys = None
 
     """ Run the simulation """
 
     def step(self):
-        self.calc_positions()
-        self.calc_rays()
-        self.sensor_values()
+        with PROFILER.phase("Model.calc_positions"):
+            self.calc_positions()
+        with PROFILER.phase("Model.calc_rays"):
+            self.calc_rays()
+        with PROFILER.phase("Model.sensor_values"):
+            self.sensor_values()
+
+    def step_many(self, car_positions):
+        """ Sensor values for many car positions at once, e.g. a drive-by along the x axis:
+        (positions, xy) -> array of (positions, sensors, {direct, left cross, right cross})
+        The obstacles are converted to arrays once, the state of the model is not changed.
+        With occlusion, the positions are stepped one by one on a copy of the model.
+        """
+        import numpy as np
+        import ray_engine
+
+        if self.occlusion:
+            model = Model(self.layout, occlusion=True)
+            model.rect_list, model.polygon_list, model.circle_list = \
+                self.rect_list, self.polygon_list, self.circle_list
+            values = []
+            for car_pos in np.asarray(car_positions, dtype=float).reshape((-1, 2)):
+                model.car_pos = tuple(car_pos.tolist())
+                model.step()
+                values.append([(sensor.direct_val, sensor.cross_val_l, sensor.cross_val_r)
+                               for sensor in model.sensor_list])
+            return np.array(values, dtype=float).reshape((-1, len(self.sensor_list), 3))
+
+        scene = ray_engine.SceneArrays(self.rect_list + self.polygon_list, self.circle_list)
+        sensors = ray_engine.sensor_positions(car_positions, self.layout)
+        sides = max([len(scene.edges(direction).segments) for direction in self.layout.facing], default=0)
+        chunk = max(1, STEP_MANY_CHUNK // (sides + len(self.circle_list) + 1))
+        values = [ray_engine.sensor_values(sensors[i:i + chunk], scene, self.layout)
+                  for i in range(0, len(sensors), chunk)]
+        if not values:
+            return np.zeros((0, len(self.sensor_list), 3))
+        return np.concatenate(values)
+
+    def update_index(self, edge_list, circle_list):
+        """ Rebuilding the spatial index of the obstacle bounding boxes """
+        self.edge_index.clear()
+        for obstacle in edge_list:
+            self.edge_index.insert(obstacle, obstacle.box)
+        self.circle_index.clear()
+        for circle in circle_list:
+            self.circle_index.insert(circle, circle.box)
 
     def calc_positions(self):
         """ Updating sensor coordinates """
@@ -103,54 +273,140 @@ class Model:
             sensor.update_loc(self.car_pos)
 
     def calc_rays(self):
+        """ The echoes are cached per obstacle pose:
+        If the car moved, every obstacle is solved again,
+        otherwise only the obstacles that were added or moved since the last step
+        """
+        edge_list = self.rect_list + self.polygon_list
+        keys = [echo_key(obstacle) for obstacle in edge_list] + [echo_key(circle) for circle in self.circle_list]
+        if self.car_pos != self.solved_car_pos:
+            self.solved_car_pos = self.car_pos
+            self.solved_keys = []
+            for found in self.direct_found + self.cross_found:
+                found.clear()
+        elif keys == self.solved_keys:
+            """ Nothing changed """
+            return
+
+        """ Forget the obstacles that were removed or moved """
+        current = set(keys)
+        for found in self.direct_found + self.cross_found:
+            for key in [key for key in found if key not in current]:
+                del found[key]
+
+        solved = set(self.solved_keys)
+        PROFILER.count("Model.solve")
+        self.solve([obstacle for obstacle in edge_list if echo_key(obstacle) not in solved],
+                   [circle for circle in self.circle_list if echo_key(circle) not in solved])
+        self.solved_keys = keys
+        with PROFILER.phase("Model.collect_echoes"):
+            if self.occlusion:
+                self.update_occluders(edge_list + self.circle_list, keys)
+            self.collect_echoes(keys)
+
+    def update_occluders(self, obstacles, keys):
+        """ Rebuilding the spatial index of all obstacles for the occlusion test if they changed """
+        if keys == self.occluder_keys:
+            return
+        self.occluder_index.clear()
+        for obstacle in obstacles:
+            self.occluder_index.insert(obstacle, obstacle.box)
+        self.occluder_keys = keys
+
+    def path_clear(self, points):
+        """ Is the echo path through the points (sensor, echo point[, other sensor]) free of obstacles:
+        only the obstacles in the grid cells along each leg are tested, from the sensor on """
+        PROFILER.count("path_clear")
+        for start, end in zip(points, points[1:]):
+            for obstacle in self.occluder_index.segment_query(start, end):
+                if leg_blocked(start, end, obstacle):
+                    return False
+        return True
+
+    def solve(self, edge_list, circle_list):
+        """ Solving the given obstacles for every sensor and adjacent sensor pair,
+        the rectangles and polygons are solved on their sides, the circles on their arc
+        """
+        self.update_index(edge_list, circle_list)
+
         """ Direct echoes: """
+        with PROFILER.phase("Model.solve.direct"):
+            for i, sensor in enumerate(self.sensor_list):
+                box = view_box(sensor)
+                obstacles = self.edge_index.query(box)
+                PROFILER.count("edge_solve", len(obstacles))
+                for obstacle in obstacles:
+                    direct_point = edge_solve(sensor, obstacle)
+                    """If found, store it"""
+                    if direct_point != (0, 0):
+                        self.direct_found[i][echo_key(obstacle)] = direct_point
+
+                circles = self.circle_index.query(box)
+                PROFILER.count("circle_solve", len(circles))
+                for circle in circles:
+                    direct_point = circle_solve(sensor, circle)
+                    """If found, store it"""
+                    if direct_point != (0, 0):
+                        self.direct_found[i][echo_key(circle)] = direct_point
+
+        """ Cross-echoes of the sensor pairs of the layout: """
+        for i, (first, second) in enumerate(self.layout.pairs):
+            sensor = self.sensor_list[first]
+            other = self.sensor_list[second]
+            """Only the obstacles in the view of both sensors"""
+            box = box_intersection(view_box(sensor), view_box(other))
+            if box is None:
+                continue
+            """For rectangles and polygons"""
+            with PROFILER.phase("Model.solve.cross_edge"):
+                obstacles = self.edge_index.query(box)
+                PROFILER.count("cross_edgesolve", len(obstacles))
+                for obstacle in obstacles:
+                    cross_point = cross_edgesolve(sensor, other, obstacle)
+                    """If found, store it"""
+                    if cross_point != (0, 0):
+                        self.cross_found[i][echo_key(obstacle)] = cross_point
+
+            """ For circles: """
+            with PROFILER.phase("Model.solve.cross_circle"):
+                circles = self.circle_index.query(box)
+                PROFILER.count("cross_circlesolve", len(circles))
+                for circle in circles:
+                    cross_point = cross_circlesolve(sensor, other, circle)
+                    """If found, store it"""
+                    if cross_point != (0, 0):
+                        self.cross_found[i][echo_key(circle)] = cross_point
+
+    def collect_echoes(self, keys):
+        """ Filling the output lists from the cached echoes in the order of the obstacle lists,
+        the last cross-echo of a sensor pair is used for the sensor values
+        """
+        order = {key: i for i, key in enumerate(keys)}
         self.direct_list = []
+        self.cross_list = []
         for sensor in self.sensor_list:
-            sensor.cross_echo_l.clear()
-            sensor.cross_echo_r.clear()
-            sensor.direct_echoes.clear()
+            sensor.cross_echo_l = []
+            sensor.cross_echo_r = []
+            sensor.direct_echoes = []
 
         for i, sensor in enumerate(self.sensor_list):
-            for j, rect in enumerate(self.rect_list):
-                direct_point = rect_solve(sensor, rect)
-                """If found, append to lists"""
-                if direct_point != (0, 0):
-                    self.direct_list.append([(sensor.x, sensor.y), direct_point])
-                    sensor.direct_echoes.append(direct_point)
-
-            for k, circle in enumerate(self.circle_list):
-                direct_point = circle_solve(sensor, circle)
-                """If found, append to lists"""
-                if direct_point != (0, 0):
-                    self.direct_list.append([(sensor.x, sensor.y), direct_point])
-                    sensor.direct_echoes.append(direct_point)
-
-        """ Cross-echoes: """
-        self.cross_list = []
-        for i, sensor in enumerate(self.sensor_list):
-            if i == 5:
-                break
-            """For rectangles"""
-            for j, rect in enumerate(self.rect_list):
-                cross_point = cross_rectsolve(sensor, self.sensor_list[i + 1], rect)
-                """If found, append to lists"""
-                if cross_point != (0, 0):
-                    self.cross_list.append([(sensor.x, sensor.y), cross_point,
-                                            (self.sensor_list[i + 1].x, self.sensor_list[i + 1].y)])
-                    sensor.cross_echo_r = [cross_point[0], cross_point[1],
-                                           self.sensor_list[i + 1].x, self.sensor_list[i + 1].y]
-                    self.sensor_list[i + 1].cross_echo_l = [cross_point[0], cross_point[1], sensor.x, sensor.y]
-
-            """ For circles: """
-            for k, circle in enumerate(self.circle_list):
-                cross_point = cross_circlesolve(sensor, self.sensor_list[i + 1], circle)
-                """If found, append to lists"""
-                if cross_point != (0, 0):
-                    self.cross_list.append([(sensor.x, sensor.y), cross_point,
-                                            (self.sensor_list[i + 1].x, self.sensor_list[i + 1].y)])
-                    sensor.cross_echo_r = [cross_point[0], cross_point[1],
-                                           self.sensor_list[i + 1].x, self.sensor_list[i + 1].y]
-                    self.sensor_list[i + 1].cross_echo_l = [cross_point[0], cross_point[1], sensor.x, sensor.y]
+            for key in sorted(self.direct_found[i], key=order.get):
+                direct_point = self.direct_found[i][key]
+                if self.occlusion and not self.path_clear((sensor.pos, direct_point)):
+                    continue
+                self.direct_list.append([(sensor.x, sensor.y), direct_point])
+                sensor.direct_echoes.append(direct_point)
+
+        for (first, second), found in zip(self.layout.pairs, self.cross_found):
+            sensor = self.sensor_list[first]
+            other = self.sensor_list[second]
+            for key in sorted(found, key=order.get):
+                cross_point = found[key]
+                if self.occlusion and not self.path_clear((sensor.pos, cross_point, other.pos)):
+                    continue
+                self.cross_list.append([(sensor.x, sensor.y), cross_point, (other.x, other.y)])
+                sensor.cross_echo_r = [cross_point[0], cross_point[1], other.x, other.y]
+                other.cross_echo_l = [cross_point[0], cross_point[1], sensor.x, sensor.y]
 
     def sensor_values(self):
         for i, sensor in enumerate(self.sensor_list):
@@ -177,29 +433,66 @@ def normal_vect(x1, y1, x2, y2):
 
 
 def range_check(sensor, point):
-    """ Is a given point in range of the sensor? """
-    x1, y1 = sensor.x, sensor.y
-    x2, y2 = point[0], point[1]
-    if 3 < distance(x1, y1, x2, y2):
-        return 0
-
-    """ Angle of view: """
-    if 0 == sensor.index:
-        min_angle = math.pi / 4 - math.pi / 3
-        max_angle = math.pi / 4 + math.pi / 3
-    elif 5 == sensor.index:
-        min_angle = -math.pi / 4 - math.pi / 3
-        max_angle = -math.pi / 4 + math.pi / 3
-    else:
-        min_angle = -math.pi / 3
-        max_angle = math.pi / 3
-    dx = x2 - x1
-    dy = y2 - y1
-    if min_angle < math.atan2(dy, dx) < max_angle:
+    """ Is a given point in range and in the view cone of the sensor? """
+    if sensor.mount.sees(point[0] - sensor.x, point[1] - sensor.y):
         return 1
     return 0
 
 
+def view_box(sensor):
+    """ Bounding box (min_x, min_y, max_x, max_y) of the area in range of the sensor """
+    extent = sensor.mount.extent
+    return sensor.x + extent[0], sensor.y + extent[1], sensor.x + extent[2], sensor.y + extent[3]
+
+
+def bounding_box(points):
+    """ Bounding box (min_x, min_y, max_x, max_y) of the given points """
+    xs = [point[0] for point in points]
+    ys = [point[1] for point in points]
+    return min(xs), min(ys), max(xs), max(ys)
+
+
+def on_edge(point, bounds):
+    """ Is a point on a line inside the bounding box of the side """
+    return bounds[0] <= point[0] <= bounds[2] and bounds[1] <= point[1] <= bounds[3]
+
+
+def legs_cross(start, end, p, q):
+    """ Does the leg from start to end cross the side from p to q before its end (and after its start) """
+    dx, dy = end[0] - start[0], end[1] - start[1]
+    ex, ey = q[0] - p[0], q[1] - p[1]
+    div = dx * ey - dy * ex
+    if div == 0:
+        """ Parallel """
+        return False
+    wx, wy = p[0] - start[0], p[1] - start[1]
+    t = (wx * ey - wy * ex) / div
+    u = (wx * dy - wy * dx) / div
+    margin = OCCLUSION_TOLERANCE / math.sqrt(dx ** 2 + dy ** 2)
+    return margin < t < 1 - margin and 0 <= u <= 1
+
+
+def leg_blocked(start, end, obstacle):
+    """ Does a straight leg of an echo path pass through the obstacle:
+    a circle if it gets closer to the center than the radius, a rectangle or polygon if it crosses a side or runs
+    inside it
+    """
+    if isinstance(obstacle, Circle):
+        dx, dy = end[0] - start[0], end[1] - start[1]
+        length = dx ** 2 + dy ** 2
+        t = ((obstacle.center[0] - start[0]) * dx + (obstacle.center[1] - start[1]) * dy) / length if length else 0
+        t = min(max(t, 0), 1)
+        return distance(start[0] + t * dx, start[1] + t * dy, obstacle.center[0], obstacle.center[1]) \
+            < obstacle.radius - OCCLUSION_TOLERANCE
+    corners = obstacle.corners
+    if any(legs_cross(start, end, corners[i - 1], corners[i]) for i in range(len(corners))):
+        return True
+    """ A leg from a sensor inside the obstacle may not cross any side """
+    x, y = (start[0] + end[0]) / 2, (start[1] + end[1]) / 2
+    return all((q[0] - p[0]) * (y - p[1]) - (q[1] - p[1]) * (x - p[0]) < -OCCLUSION_TOLERANCE * distance_p(p, q)
+               for p, q in zip(corners[-1:] + corners[:-1], corners))
+
+
 def line_intersection(line1, line2):
     """ Computing the intersection of two lines """
     xdiff = (line1[0][0] - line1[1][0], line2[0][0] - line2[1][0])
@@ -219,136 +512,22 @@ def line_intersection(line1, line2):
     return x, y
 
 
-def rect_solve(sensor, rectangle):
-    """ Compute the direct echo point for a given rectangle:
-    The upper left corner of the rect is A,
-    clockwise, the other corners are B, C and D.
-    Its sides are AB, BC, CD, DA respectively
-    Based on the inclination angle, two sides can be sensor facing at one point in time
+def edge_solve(sensor, obstacle):
+    """ Compute the direct echo point for a given rectangle or polygon:
+    the echo is the projection of the sensor to the first side facing it that it falls on
     """
-    normal_AB = normal_vect(rectangle.corner_A[0], rectangle.corner_A[1],
-                            rectangle.corner_B[0], rectangle.corner_B[1])
-    normal_BC = normal_vect(rectangle.corner_B[0], rectangle.corner_B[1],
-                            rectangle.corner_C[0], rectangle.corner_C[1])
-    normal_CD = normal_vect(rectangle.corner_C[0], rectangle.corner_C[1],
-                            rectangle.corner_D[0], rectangle.corner_D[1])
-    normal_DA = normal_vect(rectangle.corner_D[0], rectangle.corner_D[1],
-                            rectangle.corner_A[0], rectangle.corner_A[1])
-
-    if 0 <= rectangle.angle < math.pi / 2:
-        """ AD and CD"""
-        line_AD = [rectangle.corner_A, rectangle.corner_D]
-        ray2AD = [(sensor.x, sensor.y), (sensor.x + normal_DA[0] * 3, sensor.y + normal_DA[1] * 3)]
-        point = line_intersection(line_AD, ray2AD)
-        if point != (0, 0):
-            if range_check(sensor, point):
-                point = (round(point[0], 10), round(point[1], 10))
-                line_AD = [(round(line_AD[0][0], 10), round(line_AD[0][1], 10)),
-                           (round(line_AD[1][0], 10), round(line_AD[1][1], 10))]
-                if ((line_AD[0][0] >= point[0] >= line_AD[1][0]) or (line_AD[0][0] <= point[0] <= line_AD[1][0])) \
-                        and ((line_AD[0][1] >= point[1] >= line_AD[1][1]) or (
-                        line_AD[0][1] <= point[1] <= line_AD[1][1])):
-                    return point
-
-        line_CD = [rectangle.corner_C, rectangle.corner_D]
-        ray2CD = [(sensor.x, sensor.y), (sensor.x + normal_CD[0] * 3, sensor.y + normal_CD[1] * 3)]
-        point = line_intersection(line_CD, ray2CD)
-        if point != (0, 0):
-            point = (round(point[0], 10), round(point[1], 10))
-            line_CD = [(round(line_CD[0][0], 10), round(line_CD[0][1], 10)),
-                       (round(line_CD[1][0], 10), round(line_CD[1][1], 10))]
-            if range_check(sensor, point):
-                if ((line_CD[0][0] >= point[0] >= line_CD[1][0]) or (line_CD[0][0] <= point[0] <= line_CD[1][0])) \
-                        and ((line_CD[0][1] >= point[1] >= line_CD[1][1]) or (
-                        line_CD[0][1] <= point[1] <= line_CD[1][1])):
-                    return point
-        return 0, 0
-
-    elif math.pi / 2 <= rectangle.angle < math.pi:
-        """ CD and BC """
-        line_CD = [rectangle.corner_C, rectangle.corner_D]
-        ray2CD = [(sensor.x, sensor.y), (sensor.x + normal_CD[0] * 3, sensor.y + normal_CD[1] * 3)]
-        point = line_intersection(line_CD, ray2CD)
-        if point != (0, 0):
-            point = (round(point[0], 10), round(point[1], 10))
-            line_CD = [(round(line_CD[0][0], 10), round(line_CD[0][1], 10)),
-                       (round(line_CD[1][0], 10), round(line_CD[1][1], 10))]
-            if range_check(sensor, point):
-                if ((line_CD[0][0] >= point[0] >= line_CD[1][0]) or (line_CD[0][0] <= point[0] <= line_CD[1][0])) \
-                        and ((line_CD[0][1] >= point[1] >= line_CD[1][1]) or (
-                        line_CD[0][1] <= point[1] <= line_CD[1][1])):
-                    return point
-
-        line_BC = [rectangle.corner_B, rectangle.corner_C]
-        ray2BC = [(sensor.x, sensor.y), (sensor.x + normal_BC[0] * 3, sensor.y + normal_BC[1] * 3)]
-        point = line_intersection(line_BC, ray2BC)
-        if point != (0, 0):
-            point = (round(point[0], 10), round(point[1], 10))
-            line_BC = [(round(line_BC[0][0], 10), round(line_BC[0][1], 10)),
-                       (round(line_BC[1][0], 10), round(line_BC[1][1], 10))]
-            if range_check(sensor, point):
-                if ((line_BC[0][0] >= point[0] >= line_BC[1][0]) or (line_BC[0][0] <= point[0] <= line_BC[1][0])) \
-                        and ((line_BC[0][1] >= point[1] >= line_BC[1][1]) or (
-                        line_BC[0][1] <= point[1] <= line_BC[1][1])):
-                    return point
-        return 0, 0
-
-    elif math.pi <= rectangle.angle < math.pi * 3 / 2:
-        """ BC and AB """
-        line_BC = [rectangle.corner_B, rectangle.corner_C]
-        ray2BC = [(sensor.x, sensor.y), (sensor.x + normal_BC[0] * 3, sensor.y + normal_BC[1] * 3)]
-        point = line_intersection(line_BC, ray2BC)
-        if point != (0, 0):
-            point = (round(point[0], 10), round(point[1], 10))
-            line_BC = [(round(line_BC[0][0], 10), round(line_BC[0][1], 10)),
-                       (round(line_BC[1][0], 10), round(line_BC[1][1], 10))]
-            if range_check(sensor, point):
-                if ((line_BC[0][0] >= point[0] >= line_BC[1][0]) or (line_BC[0][0] <= point[0] <= line_BC[1][0])) \
-                        and ((line_BC[0][1] >= point[1] >= line_BC[1][1]) or (
-                        line_BC[0][1] <= point[1] <= line_BC[1][1])):
-                    return point
-
-        line_AB = [rectangle.corner_A, rectangle.corner_B]
-        ray2AB = [(sensor.x, sensor.y), (sensor.x + normal_AB[0] * 3, sensor.y + normal_AB[1] * 3)]
-        point = line_intersection(line_AB, ray2AB)
-        if point != (0, 0):
-            point = (round(point[0], 10), round(point[1], 10))
-            line_AB = [(round(line_AB[0][0], 10), round(line_AB[0][1], 10)),
-                       (round(line_AB[1][0], 10), round(line_AB[1][1], 10))]
-            if range_check(sensor, point):
-                if ((line_AB[0][0] >= point[0] >= line_AB[1][0]) or (line_AB[0][0] <= point[0] <= line_AB[1][0])) \
-                        and ((line_AB[0][1] >= point[1] >= line_AB[1][1]) or (
-                        line_AB[0][1] <= point[1] <= line_AB[1][1])):
-                    return point
-        return 0, 0
+    if sensor.facing is FORWARD:
+        sides = zip(obstacle.facing_edges, obstacle.facing_normals, obstacle.edge_bounds, obstacle.unrounded_check)
     else:
-        """ AB and DA """
-        line_AB = [rectangle.corner_A, rectangle.corner_B]
-        ray2AB = [(sensor.x, sensor.y), (sensor.x + normal_AB[0] * 3, sensor.y + normal_AB[1] * 3)]
-        point = line_intersection(line_AB, ray2AB)
-        if point != (0, 0):
-            point = (round(point[0], 10), round(point[1], 10))
-            line_AB = [(round(line_AB[0][0], 10), round(line_AB[0][1], 10)),
-                       (round(line_AB[1][0], 10), round(line_AB[1][1], 10))]
-            if range_check(sensor, point):
-                if ((line_AB[0][0] >= point[0] >= line_AB[1][0]) or (line_AB[0][0] <= point[0] <= line_AB[1][0])) \
-                        and ((line_AB[0][1] >= point[1] >= line_AB[1][1]) or (
-                        line_AB[0][1] <= point[1] <= line_AB[1][1])):
-                    return point
-
-        line_AD = [rectangle.corner_A, rectangle.corner_D]
-        ray2AD = [(sensor.x, sensor.y), (sensor.x + normal_DA[0] * 3, sensor.y + normal_DA[1] * 3)]
-        point = line_intersection(line_AD, ray2AD)
+        sides = zip(*obstacle.sides(sensor.facing))
+    for line, normal, bounds, unrounded in sides:
+        ray = [(sensor.x, sensor.y), (sensor.x + normal[0] * 3, sensor.y + normal[1] * 3)]
+        point = line_intersection(line, ray)
         if point != (0, 0):
-            point = (round(point[0], 10), round(point[1], 10))
-            line_AD = [(round(line_AD[0][0], 10), round(line_AD[0][1], 10)),
-                       (round(line_AD[1][0], 10), round(line_AD[1][1], 10))]
-            if range_check(sensor, point):
-                if ((line_AD[0][0] >= point[0] >= line_AD[1][0]) or (line_AD[0][0] <= point[0] <= line_AD[1][0])) \
-                        and ((line_AD[0][1] >= point[1] >= line_AD[1][1]) or (
-                        line_AD[0][1] <= point[1] <= line_AD[1][1])):
-                    return point
-        return 0, 0
+            rounded = (round(point[0], 10), round(point[1], 10))
+            if range_check(sensor, point if unrounded else rounded) and on_edge(rounded, bounds):
+                return rounded
+    return 0, 0
 
 
 def circle_solve(sensor, circle):
@@ -365,11 +544,12 @@ def circle_solve(sensor, circle):
         return 0, 0
 
 
-def mirror_point(point, line):
-    """ Mirroring a point to a P1(x1,y1) - P2(x2, y2) line"""
+def mirror_point(point, line, normal=None):
+    """ Mirroring a point to a P1(x1,y1) - P2(x2, y2) line, its right side normal can be given if it is known"""
     x1, y1 = line[0][0], line[0][1]
     x2, y2 = line[1][0], line[1][1]
-    normal = normal_vect(x1, y1, x2, y2)
+    if normal is None:
+        normal = normal_vect(x1, y1, x2, y2)
     """ Projection: """
     ray = [(point[0], point[1]), (point[0] + normal[0] * 10, point[1] + normal[1] * 10)]
     inter_point = line_intersection(ray, line)
@@ -381,147 +561,34 @@ def mirror_point(point, line):
         return 0, 0
 
 
-def cross_rectsolve(sensor1, sensor2, rectangle):
-    """ Cross-echo point of two adjacent sensors on a rectangle """
+def cross_edgesolve(sensor1, sensor2, obstacle):
+    """ Cross-echo point of two adjacent sensors on a rectangle or polygon:
+    The first facing side, where the lines connecting each sensor with the mirror image of the other one cross,
+    the sensors of a pair are in the same group and face the same way
+    """
     sensor_p1 = (sensor1.x, sensor1.y)
     sensor_p2 = (sensor2.x, sensor2.y)
 
-    if 0 <= rectangle.angle < math.pi / 2:
-        """ AD and CD"""
-        line_AD = [rectangle.corner_D, rectangle.corner_A]
-        mirror_s1 = mirror_point(sensor_p1, line_AD)
-        mirror_s2 = mirror_point(sensor_p2, line_AD)
-        if (mirror_s1 != (0, 0)) & (mirror_s2 != (0, 0)):
-            cross_echo_p = line_intersection((sensor_p1, mirror_s2), (sensor_p2, mirror_s1))
-            if range_check(sensor1, cross_echo_p) & range_check(sensor2, cross_echo_p):
-                cross_echo_p = (round(cross_echo_p[0], 10), round(cross_echo_p[1], 10))
-                line_AD = [(round(line_AD[0][0], 10), round(line_AD[0][1], 10)),
-                           (round(line_AD[1][0], 10), round(line_AD[1][1], 10))]
-                if ((line_AD[0][0] >= cross_echo_p[0] >= line_AD[1][0]) or (
-                        line_AD[0][0] <= cross_echo_p[0] <= line_AD[1][0])) \
-                        and ((line_AD[0][1] >= cross_echo_p[1] >= line_AD[1][1]) or (
-                        line_AD[0][1] <= cross_echo_p[1] <= line_AD[1][1])):
-                    return cross_echo_p
-
-        line_CD = [rectangle.corner_C, rectangle.corner_D]
-        mirror_s1 = mirror_point(sensor_p1, line_CD)
-        mirror_s2 = mirror_point(sensor_p2, line_CD)
-        if (mirror_s1 != (0, 0)) & (mirror_s2 != (0, 0)):
-            cross_echo_p = line_intersection((sensor_p1, mirror_s2), (sensor_p2, mirror_s1))
-            if range_check(sensor1, cross_echo_p) & range_check(sensor2, cross_echo_p):
-                cross_echo_p = (round(cross_echo_p[0], 10), round(cross_echo_p[1], 10))
-                line_CD = [(round(line_CD[0][0], 10), round(line_CD[0][1], 10)),
-                           (round(line_CD[1][0], 10), round(line_CD[1][1], 10))]
-                if ((line_CD[0][0] >= cross_echo_p[0] >= line_CD[1][0]) or (
-                        line_CD[0][0] <= cross_echo_p[0] <= line_CD[1][0])) \
-                        and ((line_CD[0][1] >= cross_echo_p[1] >= line_CD[1][1]) or (
-                        line_CD[0][1] <= cross_echo_p[1] <= line_CD[1][1])):
-                    return cross_echo_p
-        return 0, 0
-
-    elif math.pi / 2 <= rectangle.angle < math.pi:
-        """ CD and BC """
-        line_CD = [rectangle.corner_C, rectangle.corner_D]
-        mirror_s1 = mirror_point(sensor_p1, line_CD)
-        mirror_s2 = mirror_point(sensor_p2, line_CD)
-        if (mirror_s1 != (0, 0)) & (mirror_s2 != (0, 0)):
-            cross_echo_p = line_intersection((sensor_p1, mirror_s2), (sensor_p2, mirror_s1))
-            if range_check(sensor1, cross_echo_p) & range_check(sensor2, cross_echo_p):
-                cross_echo_p = (round(cross_echo_p[0], 10), round(cross_echo_p[1], 10))
-                line_CD = [(round(line_CD[0][0], 10), round(line_CD[0][1], 10)),
-                           (round(line_CD[1][0], 10), round(line_CD[1][1], 10))]
-                if ((line_CD[0][0] >= cross_echo_p[0] >= line_CD[1][0]) or (
-                        line_CD[0][0] <= cross_echo_p[0] <= line_CD[1][0])) \
-                        and ((line_CD[0][1] >= cross_echo_p[1] >= line_CD[1][1]) or (
-                        line_CD[0][1] <= cross_echo_p[1] <= line_CD[1][1])):
-                    return cross_echo_p
-
-        line_BC = [rectangle.corner_B, rectangle.corner_C]
-        mirror_s1 = mirror_point(sensor_p1, line_BC)
-        mirror_s2 = mirror_point(sensor_p2, line_BC)
-        if (mirror_s1 != (0, 0)) & (mirror_s2 != (0, 0)):
-            cross_echo_p = line_intersection((sensor_p1, mirror_s2), (sensor_p2, mirror_s1))
-            if range_check(sensor1, cross_echo_p) & range_check(sensor2, cross_echo_p):
-                cross_echo_p = (round(cross_echo_p[0], 10), round(cross_echo_p[1], 10))
-                line_BC = [(round(line_BC[0][0], 10), round(line_BC[0][1], 10)),
-                           (round(line_BC[1][0], 10), round(line_BC[1][1], 10))]
-                if ((line_BC[0][0] >= cross_echo_p[0] >= line_BC[1][0]) or (
-                        line_BC[0][0] <= cross_echo_p[0] <= line_BC[1][0])) \
-                        and ((line_BC[0][1] >= cross_echo_p[1] >= line_BC[1][1]) or (
-                        line_BC[0][1] <= cross_echo_p[1] <= line_BC[1][1])):
-                    return cross_echo_p
-        return 0, 0
-
-    elif math.pi <= rectangle.angle < math.pi * 3 / 2:
-        """ BC and AB """
-        line_BC = [rectangle.corner_B, rectangle.corner_C]
-        mirror_s1 = mirror_point(sensor_p1, line_BC)
-        mirror_s2 = mirror_point(sensor_p2, line_BC)
-        if (mirror_s1 != (0, 0)) & (mirror_s2 != (0, 0)):
-            cross_echo_p = line_intersection((sensor_p1, mirror_s2), (sensor_p2, mirror_s1))
-            if range_check(sensor1, cross_echo_p) & range_check(sensor2, cross_echo_p):
-                cross_echo_p = (round(cross_echo_p[0], 10), round(cross_echo_p[1], 10))
-                line_BC = [(round(line_BC[0][0], 10), round(line_BC[0][1], 10)),
-                           (round(line_BC[1][0], 10), round(line_BC[1][1], 10))]
-                if ((line_BC[0][0] >= cross_echo_p[0] >= line_BC[1][0]) or (
-                        line_BC[0][0] <= cross_echo_p[0] <= line_BC[1][0])) \
-                        and ((line_BC[0][1] >= cross_echo_p[1] >= line_BC[1][1]) or (
-                        line_BC[0][1] <= cross_echo_p[1] <= line_BC[1][1])):
-                    return cross_echo_p
-
-        line_AB = [rectangle.corner_A, rectangle.corner_B]
-        mirror_s1 = mirror_point(sensor_p1, line_AB)
-        mirror_s2 = mirror_point(sensor_p2, line_AB)
-        if (mirror_s1 != (0, 0)) & (mirror_s2 != (0, 0)):
-            cross_echo_p = line_intersection((sensor_p1, mirror_s2), (sensor_p2, mirror_s1))
-            if range_check(sensor1, cross_echo_p) & range_check(sensor2, cross_echo_p):
-                cross_echo_p = (round(cross_echo_p[0], 10), round(cross_echo_p[1], 10))
-                line_AB = [(round(line_AB[0][0], 10), round(line_AB[0][1], 10)),
-                           (round(line_AB[1][0], 10), round(line_AB[1][1], 10))]
-                if ((line_AB[0][0] >= cross_echo_p[0] >= line_AB[1][0]) or (
-                        line_AB[0][0] <= cross_echo_p[0] <= line_AB[1][0])) \
-                        and ((line_AB[0][1] >= cross_echo_p[1] >= line_AB[1][1]) or (
-                        line_AB[0][1] <= cross_echo_p[1] <= line_AB[1][1])):
-                    return cross_echo_p
-        return 0, 0
-
+    if sensor1.facing is FORWARD:
+        sides = zip(obstacle.facing_edges, obstacle.facing_normals, obstacle.edge_bounds)
     else:
-        """ AB and DA """
-        line_AB = [rectangle.corner_A, rectangle.corner_B]
-        mirror_s1 = mirror_point(sensor_p1, line_AB)
-        mirror_s2 = mirror_point(sensor_p2, line_AB)
+        sides = zip(*obstacle.sides(sensor1.facing)[:3])
+    for line, normal, bounds in sides:
+        mirror_s1 = mirror_point(sensor_p1, line, normal)
+        mirror_s2 = mirror_point(sensor_p2, line, normal)
         if (mirror_s1 != (0, 0)) & (mirror_s2 != (0, 0)):
             cross_echo_p = line_intersection((sensor_p1, mirror_s2), (sensor_p2, mirror_s1))
             if range_check(sensor1, cross_echo_p) & range_check(sensor2, cross_echo_p):
                 cross_echo_p = (round(cross_echo_p[0], 10), round(cross_echo_p[1], 10))
-                line_AB = [(round(line_AB[0][0], 10), round(line_AB[0][1], 10)),
-                           (round(line_AB[1][0], 10), round(line_AB[1][1], 10))]
-                if ((line_AB[0][0] >= cross_echo_p[0] >= line_AB[1][0]) or (
-                        line_AB[0][0] <= cross_echo_p[0] <= line_AB[1][0])) \
-                        and ((line_AB[0][1] >= cross_echo_p[1] >= line_AB[1][1]) or (
-                        line_AB[0][1] <= cross_echo_p[1] <= line_AB[1][1])):
+                if on_edge(cross_echo_p, bounds):
                     return cross_echo_p
-
-        line_AD = [rectangle.corner_D, rectangle.corner_A]
-        mirror_s1 = mirror_point(sensor_p1, line_AD)
-        mirror_s2 = mirror_point(sensor_p2, line_AD)
-        if (mirror_s1 != (0, 0)) & (mirror_s2 != (0, 0)):
-            cross_echo_p = line_intersection((sensor_p1, mirror_s2), (sensor_p2, mirror_s1))
-            if range_check(sensor1, cross_echo_p) & range_check(sensor2, cross_echo_p):
-                cross_echo_p = (round(cross_echo_p[0], 10), round(cross_echo_p[1], 10))
-                line_AD = [(round(line_AD[0][0], 10), round(line_AD[0][1], 10)),
-                           (round(line_AD[1][0], 10), round(line_AD[1][1], 10))]
-                if ((line_AD[0][0] >= cross_echo_p[0] >= line_AD[1][0]) or (
-                        line_AD[0][0] <= cross_echo_p[0] <= line_AD[1][0])) \
-                        and ((line_AD[0][1] >= cross_echo_p[1] >= line_AD[1][1]) or (
-                        line_AD[0][1] <= cross_echo_p[1] <= line_AD[1][1])):
-                    return cross_echo_p
-        return 0, 0
+    return 0, 0
 
 
-def cross_circlesolve(sensor1: Sensor, sensor2: Sensor, circle: Circle):
+def cross_circlesolve_sweep(sensor1: Sensor, sensor2: Sensor, circle: Circle):
     """Searching fot the cross echo point in the section between the lines connecting the sensors with the center of
-     the circle"""
+     the circle
+    Reference angular sweep, kept for checking the accuracy of cross_circlesolve"""
     v1 = (circle.center[0] - sensor1.x, circle.center[1] - sensor1.y)
     v2 = (circle.center[0] - sensor2.x, circle.center[1] - sensor2.y)
     d1 = distance(circle.center[0], circle.center[1], sensor1.x, sensor1.y)
@@ -561,3 +628,104 @@ def cross_circlesolve(sensor1: Sensor, sensor2: Sensor, circle: Circle):
         if range_check(sensor1, min_point) & range_check(sensor2, min_point):
             return min_point
     return 0, 0
+
+
+CROSS_CIRCLE_TOLERANCE = 1e-10
+
+
+def cross_circlesolve(sensor1: Sensor, sensor2: Sensor, circle: Circle):
+    """ Cross-echo point of two adjacent sensors on a circle:
+    The reflection point lies on the shorter arc between the points closest to the two sensors,
+    where the path length sensor1 - point - sensor2 is minimal.
+    The root of the path length derivative is bracketed on that arc and found by bisection.
+    """
+    cx, cy = circle.center[0], circle.center[1]
+    r = circle.radius
+    x1, y1 = sensor1.x, sensor1.y
+    x2, y2 = sensor2.x, sensor2.y
+    if distance(cx, cy, x1, y1) <= r or distance(cx, cy, x2, y2) <= r:
+        """ Sensor inside the circle """
+        return 0, 0
+
+    fi1 = math.atan2(cy - y1, cx - x1)
+    fi2 = math.atan2(cy - y2, cx - x2)
+    """ Signed angle of the shorter arc from fi1 to fi2 """
+    span = (fi2 - fi1 + math.pi) % (2 * math.pi) - math.pi
+
+    def slope(fi):
+        """ Derivative of the path length along the arc at the point of angle fi """
+        cos_fi = math.cos(fi)
+        sin_fi = math.sin(fi)
+        px = cx - r * cos_fi
+        py = cy - r * sin_fi
+        d1 = distance(px, py, x1, y1)
+        d2 = distance(px, py, x2, y2)
+        ux = (px - x1) / d1 + (px - x2) / d2
+        uy = (py - y1) / d1 + (py - y2) / d2
+        return (ux * sin_fi - uy * cos_fi) * span
+
+    low = 0.0
+    high = 1.0
+    slope_low = slope(fi1)
+    if slope_low >= 0:
+        """ The path length grows from the start of the arc """
+        high = 0.0
+    elif slope(fi1 + span) <= 0:
+        """ The path length shrinks until the end of the arc """
+        low = 1.0
+    else:
+        while (high - low) * abs(span) > CROSS_CIRCLE_TOLERANCE:
+            mid = (low + high) / 2
+            if slope(fi1 + mid * span) < 0:
+                low = mid
+            else:
+                high = mid
+
+    fi = fi1 + (low + high) / 2 * span
+    point = (cx - r * math.cos(fi), cy - r * math.sin(fi))
+    if range_check(sensor1, point) & range_check(sensor2, point):
+        return point
+    return 0, 0
+
+
+def cross_circle_check(cases):
+    """ Accuracy check of cross_circlesolve against the reference sweep on (sensor1, sensor2, circle) cases:
+    returns the smallest path length difference sweep - cross_circlesolve [m] of the cases where both find an echo,
+    negative if the sweep found a shorter path, and the numbers of cases where only cross_circlesolve and where only
+    the sweep found one.
+    The sweep returns the shortest point seen so far as soon as it is in range of both sensors, cross_circlesolve the
+    point of the shortest path if it is in range, so the two can disagree on whether there is an echo at all.
+    """
+    worst = 0.0
+    only_solver = 0
+    only_sweep = 0
+    for sensor1, sensor2, circle in cases:
+        point = cross_circlesolve(sensor1, sensor2, circle)
+        reference = cross_circlesolve_sweep(sensor1, sensor2, circle)
+        if point == (0, 0) and reference == (0, 0):
+            continue
+        if reference == (0, 0):
+            only_solver += 1
+        elif point == (0, 0):
+            only_sweep += 1
+        else:
+            sensor_p1 = (sensor1.x, sensor1.y)
+            sensor_p2 = (sensor2.x, sensor2.y)
+            worst = min(worst, distance_p(reference, sensor_p1) + distance_p(reference, sensor_p2)
+                        - distance_p(point, sensor_p1) - distance_p(point, sensor_p2))
+    return worst, only_solver, only_sweep
+
+
+def cross_circle_accuracy(count=1000, seed=0):
+    """ cross_circle_check on adjacent sensor pairs of cars at random positions around the origin and random circles
+    in front of them """
+    import random
+    rng = random.Random(seed)
+    pair_count = len(Model().sensor_list) - 1
+    cases = []
+    for _ in range(count):
+        car_pos = (rng.uniform(-1, 0), rng.uniform(-1, 1))
+        index = rng.randrange(pair_count)
+        circle = Circle((rng.uniform(0.2, 4.0), rng.uniform(-2.0, 2.0)), rng.uniform(0.05, 0.8))
+        cases.append((Sensor(car_pos, index), Sensor(car_pos, index + 1), circle))
+    return cross_circle_check(cases)
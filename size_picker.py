@@ -1,6 +1,7 @@
 import pygame
 from gui_constants import GUIConstants
 from colors import Colors
+from text_cache import TextCache
 
 
 class SizePicker:
@@ -11,6 +12,7 @@ class SizePicker:
         self.screen = screen
         self.rectangles = []
         self.selected = 1
+        self.text = TextCache(20)
 
     def set_selected(self, selected):
         self.selected = selected
@@ -39,7 +41,6 @@ class SizePicker:
 
     def draw_text(self, x, msg):
         """Draws a message into a cell"""
-        font = pygame.font.SysFont(None, 20)
-        img = font.render(msg, True, Colors.BLACK)
+        img = self.text.render(msg)
         self.screen.blit(img, ((x + 0.5) * GUIConstants.SIZE_PICKER_CELL - img.get_width() * 0.5 + self.gui_pos[0],
                                0.5 * GUIConstants.SIZE_PICKER_CELL - img.get_height() * 0.5 + self.gui_pos[1]))
@@ -0,0 +1,91 @@
+import math
+
+""" Edge length of the grid cells [m] """
+GRID_CELL_SIZE = 1.0
+
+
+def boxes_overlap(box1, box2):
+    """ Do two (min_x, min_y, max_x, max_y) boxes overlap? """
+    return box1[0] <= box2[2] and box2[0] <= box1[2] and box1[1] <= box2[3] and box2[1] <= box1[3]
+
+
+def box_intersection(box1, box2):
+    """ Common part of two (min_x, min_y, max_x, max_y) boxes, None if they do not overlap """
+    if not boxes_overlap(box1, box2):
+        return None
+    return max(box1[0], box2[0]), max(box1[1], box2[1]), min(box1[2], box2[2]), min(box1[3], box2[3])
+
+
+class GridIndex:
+    """ Uniform grid of bounding boxes:
+    Every item is stored in all the cells its box overlaps,
+    a query returns the items whose box overlaps the query box in insertion order.
+    """
+
+    def __init__(self, cell_size=GRID_CELL_SIZE):
+        self.cell_size = cell_size
+        self.cells = {}
+        self.items = []
+        self.boxes = []
+
+    def clear(self):
+        self.cells.clear()
+        self.items.clear()
+        self.boxes.clear()
+
+    def cell_range(self, box):
+        """ Cell coordinates covered by the box """
+        return (range(math.floor(box[0] / self.cell_size), math.floor(box[2] / self.cell_size) + 1),
+                range(math.floor(box[1] / self.cell_size), math.floor(box[3] / self.cell_size) + 1))
+
+    def insert(self, item, box):
+        """ Adds an item with its (min_x, min_y, max_x, max_y) bounding box """
+        key = len(self.items)
+        self.items.append(item)
+        self.boxes.append(box)
+        x_range, y_range = self.cell_range(box)
+        for x in x_range:
+            for y in y_range:
+                self.cells.setdefault((x, y), []).append(key)
+
+    def query(self, box):
+        """ Items whose bounding box overlaps the given box, in insertion order """
+        x_range, y_range = self.cell_range(box)
+        if len(self.items) <= len(x_range) * len(y_range):
+            """ Fewer items than cells to visit """
+            return [item for item, item_box in zip(self.items, self.boxes) if boxes_overlap(item_box, box)]
+        keys = set()
+        for x in x_range:
+            for y in y_range:
+                keys.update(self.cells.get((x, y), ()))
+        return [self.items[key] for key in sorted(keys) if boxes_overlap(self.boxes[key], box)]
+
+    def segment_query(self, start, end):
+        """ Items whose bounding box overlaps the box of the segment from start to end and a cell the segment passes,
+        every item once, the cells are visited from start to end (grid traversal), so the search can stop at the
+        first hit
+        """
+        x, y = math.floor(start[0] / self.cell_size), math.floor(start[1] / self.cell_size)
+        end_x, end_y = math.floor(end[0] / self.cell_size), math.floor(end[1] / self.cell_size)
+        dx, dy = end[0] - start[0], end[1] - start[1]
+        step_x = 1 if dx > 0 else -1
+        step_y = 1 if dy > 0 else -1
+        """ Segment parameter (0..1) of the next cell border crossing and between two crossings on both axes """
+        next_x = ((x + (step_x > 0)) * self.cell_size - start[0]) / dx if dx else math.inf
+        next_y = ((y + (step_y > 0)) * self.cell_size - start[1]) / dy if dy else math.inf
+        delta_x = self.cell_size / abs(dx) if dx else math.inf
+        delta_y = self.cell_size / abs(dy) if dy else math.inf
+        box = min(start[0], end[0]), min(start[1], end[1]), max(start[0], end[0]), max(start[1], end[1])
+        seen = set()
+        for _ in range(abs(end_x - x) + abs(end_y - y) + 1):
+            for key in self.cells.get((x, y), ()):
+                if key not in seen:
+                    seen.add(key)
+                    if boxes_overlap(self.boxes[key], box):
+                        yield self.items[key]
+            if next_x < next_y:
+                x += step_x
+                next_x += delta_x
+            else:
+                y += step_y
+                next_y += delta_y
@@ -0,0 +1,120 @@
+import asyncio
+import itertools
+import time
+
+from fixed_step import FixedStepLoop, SIMULATION_RATE
+from recording import Frame, control_input
+
+""" Streaming of sensor frames:
+a source is a generator of recording.Frame objects, a stage takes an iterator of frames and yields frames.
+Every frame is computed when the consumer asks for it, so a slow consumer slows down the simulation (backpressure)
+and runs of any length are never kept in memory.
+"""
+
+
+def linear_trajectory(start, velocity, time_step=1 / SIMULATION_RATE, steps=None):
+    """Car positions of a constant velocity [m/s] drive from start, endless if steps is None"""
+    counter = itertools.count() if steps is None else range(steps)
+    for step in counter:
+        yield start[0] + velocity[0] * step * time_step, start[1] + velocity[1] * step * time_step
+
+
+def trajectory_frames(model, trajectory, time_step=1 / SIMULATION_RATE, echoes=True):
+    """Frames of the model with the car moved along a scripted trajectory (an iterable of car positions),
+    the speed of the frames is None"""
+    for step, car_pos in enumerate(trajectory):
+        model.car_pos = tuple(car_pos)
+        model.step()
+        yield Frame.from_model(step * time_step, model.car_pos, model, None, echoes)
+
+
+def drive_frames(model, control, car_speed, time_step=1 / SIMULATION_RATE, steps=None, echoes=True, can_move=None):
+    """Frames of the closed loop drive of FixedStepLoop: the control sets the speed of the car, endless if steps is
+    None"""
+    loop = FixedStepLoop(model, control, car_speed, time_step, can_move)
+    counter = itertools.count() if steps is None else range(steps)
+    for _ in counter:
+        step_time = loop.time
+        loop.step()
+        yield Frame.from_model(step_time, loop.previous_car_pos, model, loop.speed, echoes)
+
+
+def pipeline(source, *stages):
+    """Chains the stages after the source, returns the iterator of the last stage"""
+    for stage in stages:
+        source = stage(source)
+    return source
+
+
+def control_stage(control):
+    """Stage that feeds the sensor values to the control and sets the speed of the frames"""
+    def stage(frames):
+        for frame in frames:
+            control.input = control_input(frame, len(frame.values) // 3)
+            frame.speed = control.get_speed()
+            yield frame
+    return stage
+
+
+def record_stage(recorder):
+    """Stage that adds the frames to a recording.Recorder"""
+    def stage(frames):
+        for frame in frames:
+            recorder.record_frame(frame)
+            yield frame
+    return stage
+
+
+def tap(consumer):
+    """Stage that calls consumer(frame) for every frame, e.g. a logger"""
+    def stage(frames):
+        for frame in frames:
+            consumer(frame)
+            yield frame
+    return stage
+
+
+def feature_stage(name, function):
+    """Stage that stores function(frame) as an attribute of the frames, e.g. the closest echo of the frame"""
+    def stage(frames):
+        for frame in frames:
+            setattr(frame, name, function(frame))
+            yield frame
+    return stage
+
+
+def throttle(rate):
+    """Stage that lets the frames through in real time, at most rate [Hz] frames per second"""
+    def stage(frames):
+        period = 1 / rate
+        next_time = time.perf_counter()
+        for frame in frames:
+            delay = next_time - time.perf_counter()
+            if delay > 0:
+                time.sleep(delay)
+            next_time = max(next_time + period, time.perf_counter() - period)
+            yield frame
+    return stage
+
+
+def consume(frames, limit=None):
+    """Pulls the frames through the pipeline without keeping them, returns the number of frames"""
+    count = 0
+    for _ in itertools.islice(frames, limit):
+        count += 1
+    return count
+
+
+async def async_frames(frames, rate=None):
+    """Async iterator of a frame iterator for asyncio consumers.
+    A frame is only computed when the consumer asks for the next one, with rate [Hz] at most rate frames per
+    second are given out, waiting without blocking the event loop."""
+    loop = asyncio.get_running_loop()
+    next_time = loop.time()
+    for frame in frames:
+        if rate is None:
+            await asyncio.sleep(0)
+        else:
+            await asyncio.sleep(max(next_time - loop.time(), 0))
+            next_time = max(next_time + 1 / rate, loop.time() - 1 / rate)
+        yield frame
@@ -0,0 +1,59 @@
+import functools
+import itertools
+import os
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+
+import headless
+from control import Control
+from scenario import Scenario
+
+""" Parameter studies on a process pool: a work item is a Scenario, run with the default sensor layout of the sweep,
+or a (Scenario, sensor_layout.SensorLayout) pair, so one sweep can compare sensor configurations.
+"""
+
+""" Number of scenarios sent to a worker process at once """
+SWEEP_CHUNK_SIZE = 16
+""" Number of chunks queued per worker process """
+SWEEP_CHUNKS_PER_WORKER = 2
+
+
+def scenario_grid(layouts, car_positions, steps=1, step_size=0.0, sensor_layouts=None):
+    """Every obstacle layout with every car start position, layouts are (rectangles, circles) pairs.
+    With sensor_layouts, every scenario is run with every sensor layout: the items are (Scenario, SensorLayout) pairs,
+    the sensor layouts of one scenario follow each other."""
+    scenarios = (Scenario(rectangles, circles, car_pos, steps, step_size)
+                 for (rectangles, circles), car_pos in itertools.product(layouts, car_positions))
+    if sensor_layouts is None:
+        return scenarios
+    sensor_layouts = list(sensor_layouts)
+    return ((scenario, sensor_layout) for scenario in scenarios for sensor_layout in sensor_layouts)
+
+
+def run_scenario(scenario, layout=None):
+    """Runs a scenario with the sensor layout, returns the rows of headless.drive for every step"""
+    return list(headless.drive(scenario.model(layout), Control(), scenario.steps, scenario.step_size))
+
+
+def run_chunk(items, layout=None):
+    """Runs a list of work items in a worker process, the scenarios without a sensor layout use the given one"""
+    return [run_scenario(*item) if isinstance(item, tuple) else run_scenario(item, layout) for item in items]
+
+
+def sweep(scenarios, workers=None, chunk_size=SWEEP_CHUNK_SIZE, layout=None):
+    """Runs the work items (scenarios or (scenario, sensor layout) pairs) on a pool of worker processes and yields
+    their results in order. The items can be a generator, only a few chunks per worker are queued at a time.
+    The scenarios without a sensor layout use the given one (default: DEFAULT_LAYOUT).
+    """
+    workers = workers or os.cpu_count() or 1
+    run = functools.partial(run_chunk, layout=layout)
+    scenarios = iter(scenarios)
+    chunks = iter(lambda: list(itertools.islice(scenarios, chunk_size)), [])
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        pending = deque(executor.submit(run, chunk)
+                        for chunk in itertools.islice(chunks, workers * SWEEP_CHUNKS_PER_WORKER))
+        while pending:
+            results = pending.popleft().result()
+            for chunk in itertools.islice(chunks, 1):
+                pending.append(executor.submit(run, chunk))
+            yield from results
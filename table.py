@@ -1,49 +1,77 @@
 import pygame
 from gui_constants import GUIConstants
 from colors import Colors
+from text_cache import TextCache
 
 
 class Table:
-    def __init__(self, screen, gui_pos):
-        """Table element for the display of the measured values"""
+    def __init__(self, screen, gui_pos, rows, max_height):
+        """Table element for the display of the measured values of the given number of sensors (rows),
+        the rows are made lower to fit into max_height [px], a ValueError is raised if they cannot be"""
         self.screen = screen
         self.gui_pos = gui_pos
+        self.rows = rows
+        self.cell_height = min(GUIConstants.TABLE_CELL_HEIGHT, int(max_height // (rows + 1)))
+        if self.cell_height < GUIConstants.TABLE_MIN_CELL_HEIGHT:
+            raise ValueError("the table can show at most {} sensors, the layout has {}".format(
+                int(max_height // GUIConstants.TABLE_MIN_CELL_HEIGHT) - 1, rows))
+        self.text = TextCache(20)
+        """The grid and the headers are rendered once"""
+        self.background = None
+        """Texts of the value cells on the screen"""
+        self.values = {}
 
     def draw(self):
-        pygame.draw.rect(self.screen,
-                         Colors.WHITE,
-                         pygame.Rect(self.gui_pos[0], self.gui_pos[1],
-                                     4 * GUIConstants.TABLE_CELL_WIDTH,
-                                     7 * GUIConstants.TABLE_CELL_HEIGHT))
-        self.draw_grid()
-        self.draw_text(1, 0, "Direct echo [m]")
-        self.draw_text(2, 0, "Left cross echo [m]")
-        self.draw_text(3, 0, "Right cross echo [m]")
-        self.draw_text(0, 1, "Sensor 1")
-        self.draw_text(0, 2, "Sensor 2")
-        self.draw_text(0, 3, "Sensor 3")
-        self.draw_text(0, 4, "Sensor 4")
-        self.draw_text(0, 5, "Sensor 5")
-        self.draw_text(0, 6, "Sensor 6")
-
-    def draw_grid(self):
+        if self.background is None:
+            self.background = self.render_background()
+        self.screen.blit(self.background, self.gui_pos)
+
+    def render_background(self):
+        """Renders the static part of the table: the grid and the headers"""
+        surface = pygame.Surface((4 * GUIConstants.TABLE_CELL_WIDTH, (self.rows + 1) * self.cell_height))
+        surface.fill(Colors.WHITE)
+        self.draw_grid(surface)
+        self.draw_text(1, 0, "Direct echo [m]", surface)
+        self.draw_text(2, 0, "Left cross echo [m]", surface)
+        self.draw_text(3, 0, "Right cross echo [m]", surface)
+        for row in range(1, self.rows + 1):
+            self.draw_text(0, row, "Sensor {}".format(row), surface)
+        return surface
+
+    def draw_grid(self, surface):
         """Draws the grid of the table"""
         for x in range(0, 4 * GUIConstants.TABLE_CELL_WIDTH, GUIConstants.TABLE_CELL_WIDTH):
-            for y in range(0, 7 * GUIConstants.TABLE_CELL_HEIGHT, GUIConstants.TABLE_CELL_HEIGHT):
-                rect = pygame.Rect(x + self.gui_pos[0], y + self.gui_pos[1],
-                                   GUIConstants.TABLE_CELL_WIDTH, GUIConstants.TABLE_CELL_HEIGHT)
-                pygame.draw.rect(self.screen, Colors.LIGHTGREY, rect, 1)
-
-    def draw_text(self, x, y, msg):
-        """Draws a message into the cell"""
-        font = pygame.font.SysFont(None, 20)
-        img = font.render(msg, True, Colors.BLACK)
-        self.screen.blit(img, ((x + 0.5) * GUIConstants.TABLE_CELL_WIDTH - img.get_width() * 0.5 + self.gui_pos[0],
-                               (y + 0.5) * GUIConstants.TABLE_CELL_HEIGHT - img.get_height() * 0.5 + self.gui_pos[1]))
-
-    def draw_value(self, x, y, value):
-        """Draws a value into the cell"""
+            for y in range(0, (self.rows + 1) * self.cell_height, self.cell_height):
+                rect = pygame.Rect(x, y, GUIConstants.TABLE_CELL_WIDTH, self.cell_height)
+                pygame.draw.rect(surface, Colors.LIGHTGREY, rect, 1)
+
+    def draw_text(self, x, y, msg, surface=None):
+        """Draws a message into the cell, on the screen or on the given table sized surface"""
+        img = self.text.render(msg)
+        if surface is None:
+            surface = self.screen
+            origin = self.gui_pos
+        else:
+            origin = (0, 0)
+        surface.blit(img, ((x + 0.5) * GUIConstants.TABLE_CELL_WIDTH - img.get_width() * 0.5 + origin[0],
+                           (y + 0.5) * self.cell_height - img.get_height() * 0.5 + origin[1]))
+
+    def draw_value(self, x, y, value, force=False):
+        """Draws a value into the cell if it changed since the last call,
+        returns the updated area of the screen or None"""
         text = "X"
         if value != 0:
             text = str(round(value, 3))
-        self.draw_text(x, y, text)
\ No newline at end of file
+        if not force and self.values.get((x, y)) == text:
+            return None
+        self.values[(x, y)] = text
+        cell = self.cell_rect(x, y)
+        self.screen.blit(self.background, cell, cell.move(-self.gui_pos[0], -self.gui_pos[1]))
+        self.draw_text(x, y, text)
+        return cell
+
+    def cell_rect(self, x, y):
+        """Area of the cell on the screen"""
+        return pygame.Rect(x * GUIConstants.TABLE_CELL_WIDTH + self.gui_pos[0],
+                           y * self.cell_height + self.gui_pos[1],
+                           GUIConstants.TABLE_CELL_WIDTH, self.cell_height)
@@ -0,0 +1,34 @@
+import pygame
+
+from colors import Colors
+
+""" Most rendered messages kept by a TextCache """
+TEXT_CACHE_SIZE = 1024
+
+FONTS = {}
+
+
+def get_font(size):
+    """Default system font of the given size, loaded once"""
+    font = FONTS.get(size)
+    if font is None:
+        font = FONTS[size] = pygame.font.SysFont(None, size)
+    return font
+
+
+class TextCache:
+    """Rendered text surfaces by message, a message is only rendered the first time it is drawn"""
+
+    def __init__(self, size, color=Colors.BLACK):
+        self.font = get_font(size)
+        self.color = color
+        self.images = {}
+
+    def render(self, msg):
+        """Surface of the rendered message"""
+        image = self.images.get(msg)
+        if image is None:
+            if len(self.images) >= TEXT_CACHE_SIZE:
+                self.images.clear()
+            image = self.images[msg] = self.font.render(msg, True, self.color)
+        return image